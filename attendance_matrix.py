@@ -0,0 +1,136 @@
+"""
+Whole-term attendance and summary-submission matrices.
+
+Both matrices are students x classes bit matrices built in a single pass over
+the snapshot: every student is a Python int whose bit j is set when the
+student attended (or submitted a summary for) class j, with class 0 the
+oldest. Questions about the whole term are then answered with bitwise
+operations over those ints instead of re-reading the sheet per class.
+"""
+
+from collections import namedtuple
+
+from roster import normalize_name
+
+PRESENT_COLUMN = 3
+DATE_COLUMN = 2
+
+ClassInfo = namedtuple("ClassInfo", ["row", "label", "date"])
+StudentStreak = namedtuple("StudentStreak", ["name", "email", "current", "longest"])
+
+
+def _popcount(bits):
+    return bin(bits).count("1")
+
+
+def _longest_run(bits):
+    """Length of the longest run of consecutive set bits"""
+    length = 0
+    while bits:
+        bits &= bits << 1
+        length += 1
+    return length
+
+
+class AttendanceMatrix:
+    def __init__(self, names, emails, classes, present, submitted, present_by_class):
+        self.names = names  # Students in roster order
+        self.emails = emails
+        self.classes = classes  # ClassInfo per class, oldest first
+        self.present = present  # Per student: bit j set if present at class j
+        self.submitted = submitted  # Per student: bit j set if a summary was submitted for class j
+        self.present_by_class = present_by_class  # Per class: bit i set if student i was present
+        self.all_classes = (1 << len(classes)) - 1
+
+    @classmethod
+    def from_sheets(cls, attendance, roster, submissions):
+        """Build both matrices from the attendance snapshot, roster index and submissions index"""
+        names = []
+        emails = []
+        student_index = {}
+        for name in roster.names:
+            key = normalize_name(name)
+            if key in student_index:
+                continue
+            student_index[key] = len(names)
+            names.append(name)
+            emails.append(roster.email_for_name(name) or "")
+        email_index = {email: i for i, email in enumerate(emails) if email}
+
+        dates = attendance.date_column(DATE_COLUMN)
+        classes = [ClassInfo(index + 1, dates.values[index], parsed)
+                   for index, parsed in enumerate(dates.dates) if parsed is not None]
+
+        present = [0] * len(names)
+        submitted = [0] * len(names)
+        present_by_class = [0] * len(classes)
+        for j, info in enumerate(classes):
+            bit = 1 << j
+            for attendee in attendance.cell_value(info.row, PRESENT_COLUMN).split(","):
+                i = student_index.get(normalize_name(attendee))
+                if i is not None:
+                    present[i] |= bit
+                    present_by_class[j] |= 1 << i
+            for email in submissions.submitters(info.date):
+                i = email_index.get(email)
+                if i is not None:
+                    submitted[i] |= bit
+        return cls(names, emails, classes, present, submitted, present_by_class)
+
+    def absent(self, student):
+        return self.all_classes & ~self.present[student]
+
+    def unsubmitted(self, student):
+        """Classes the student missed and hasn't submitted a summary for"""
+        return self.absent(student) & ~self.submitted[student]
+
+    def class_indexes(self, bits):
+        return [j for j in range(len(self.classes)) if bits >> j & 1]
+
+    def attendance_rates(self):
+        """(ClassInfo, number present, attendance rate) per class"""
+        total = len(self.names) or 1
+        return [(info, _popcount(bits), _popcount(bits) / total)
+                for info, bits in zip(self.classes, self.present_by_class)]
+
+    def absence_streaks(self, min_length=2):
+        """Students whose current run of absences (up to the latest class) is at least min_length"""
+        streaks = []
+        for i, name in enumerate(self.names):
+            current = len(self.classes) - self.present[i].bit_length()
+            if current >= min_length:
+                streaks.append(StudentStreak(name, self.emails[i], current, _longest_run(self.absent(i))))
+        return sorted(streaks, key=lambda streak: -streak.current)
+
+    def unsubmitted_summaries(self, include_latest=True):
+        """
+        email -> list of ClassInfo the student missed without submitting a summary, over the whole term.
+        Without include_latest the latest class is left out: its summary isn't due until the next class.
+        """
+        classes = self.all_classes if include_latest else self.all_classes >> 1
+        missing = {}
+        for i, email in enumerate(self.emails):
+            bits = self.unsubmitted(i) & classes
+            if bits and email:
+                missing[email] = [self.classes[j] for j in self.class_indexes(bits)]
+        return missing
+
+    def report(self, min_streak=2):
+        """Plain-text whole-term report"""
+        lines = [f"📊 Attendance report: {len(self.names)} students, {len(self.classes)} classes", ""]
+        lines.append("Attendance per class:")
+        for info, count, rate in self.attendance_rates():
+            lines.append(f"   {info.label:<12} {count:>4}/{len(self.names):<4} {rate:>6.1%}")
+        lines.append("")
+        streaks = self.absence_streaks(min_streak)
+        lines.append(f"Absent from the last {min_streak}+ classes in a row: {len(streaks)}")
+        for streak in streaks:
+            lines.append(f"   - {streak.name} ({streak.email}): {streak.current} in a row, longest {streak.longest}")
+        lines.append("")
+        missing = self.unsubmitted_summaries()
+        lines.append(f"Students with missing summaries: {len(missing)}")
+        for i, email in enumerate(self.emails):
+            if email in missing:
+                labels = ", ".join(info.label for info in missing[email])
+                lines.append(f"   - {self.names[i]} ({email}): {labels}")
+        return "\n".join(lines)
@@ -0,0 +1,125 @@
+"""
+Benchmark FP_bot.run() on synthetic rosters, phase by phase as recorded in the bot's own metrics.
+
+Sheets access goes through the in-memory fakes in benchmarks/fakes.py (with an
+optional per-call latency) and mail goes to a local SMTP sink, so the
+benchmark needs no credentials and sends nothing.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_run [--students 10 100 1000 10000] [--weeks 30] [--latency-ms 0]
+                                   [--sheets-errors 429 503 ...]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from benchmarks.fakes import FakeClient
+from benchmarks.smtp_sink import SMTPSink
+
+DEFAULT_STUDENT_COUNTS = [10, 100, 1000, 10000]
+ABSENCE_RATE = 0.2
+SUMMARY_SUBMISSION_RATE = 0.5
+
+
+def synthetic_spreadsheet(students, weeks, seed=0):
+    """Build both worksheets for a course with the given roster size and number of weekly classes"""
+    rng = random.Random(seed)
+    names = [f"Student {i}" for i in range(students)]
+    emails = [f"student{i}@example.com" for i in range(students)]
+    last_class = date.today() - timedelta(days=1)
+    class_dates = [(last_class - timedelta(weeks=weeks - 1 - w)).strftime("%d/%m/%Y") for w in range(weeks)]
+
+    attendance = [["Timestamp", "Class date", "Present", "", "", "", "Email", "Name"]]
+    summaries = [["Timestamp", "", "", "Email", "", "Class date"]]
+    for class_date in class_dates:
+        present = [name for name in names if rng.random() > ABSENCE_RATE]
+        attendance.append([class_date, class_date, ", ".join(present)])
+        present_set = set(present)
+        for name, email in zip(names, emails):
+            if name not in present_set and rng.random() < SUMMARY_SUBMISSION_RATE:
+                summaries.append([class_date, "", "", email, "", class_date])
+
+    # Roster columns 7/8 start on the first data row and may extend past the class rows
+    for i, (name, email) in enumerate(zip(names, emails)):
+        row = i + 1
+        while len(attendance) <= row:
+            attendance.append([])
+        attendance[row] = attendance[row] + [""] * (6 - len(attendance[row])) + [email, name]
+
+    return {"Form Responses 1": summaries, "Form Responses 2": attendance}
+
+
+def bench(students, weeks, latency, sink, workdir, errors=None):
+    """Run FP_bot.run() once on a synthetic course; returns its phase timings and request counts"""
+    # Imported here so the environment below is in place before the module is loaded
+    from email_sending import FP_bot
+
+    sheet_id = f"bench-{students}-{weeks}"
+    client = FakeClient({sheet_id: synthetic_spreadsheet(students, weeks)}, latency=latency, errors=errors)
+    os.environ["SEND_LEDGER_PATH"] = os.path.join(workdir, f"{sheet_id}.sqlite3")
+    os.environ["OUTBOX_DIR"] = os.path.join(workdir, f"{sheet_id}-outbox")
+    cohort = {"name": sheet_id, "spreadsheet_url": f"https://docs.google.com/spreadsheets/d/{sheet_id}/edit"}
+
+    connections_before, messages_before = sink.counts()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        bot = FP_bot(cohort=cohort, sa=client, refresh=True)
+        bot.run()
+    elapsed = time.perf_counter() - start
+    connections, messages = sink.counts()
+    return {
+        "phases": bot.metrics.phases,
+        "counters": bot.metrics.counters,
+        "wall": elapsed,
+        "sheets_calls": client.counter.total,
+        "smtp_connections": connections - connections_before,
+        "smtp_messages": messages - messages_before,
+    }
+
+
+def print_table(students, weeks, result):
+    print(f"\n{students} students x {weeks} weeks")
+    print(f"{'phase':<24}{'wall ms':>12}")
+    for name, seconds in result["phases"].items():
+        print(f"{name:<24}{seconds * 1000:>12.1f}")
+    print(f"{'total':<24}{result['wall'] * 1000:>12.1f}")
+    print(f"sheets calls: {result['sheets_calls']}, smtp connections: {result['smtp_connections']}, "
+          f"smtp messages: {result['smtp_messages']}")
+    print("counters: " + ", ".join(f"{name}={value}" for name, value in result["counters"].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FP_bot.run() phases on synthetic rosters")
+    parser.add_argument("--students", type=int, nargs="+", default=DEFAULT_STUDENT_COUNTS)
+    parser.add_argument("--weeks", type=int, default=30)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated latency per Sheets API call")
+    parser.add_argument("--sheets-errors", type=int, nargs="*", default=[],
+                        help="HTTP status (e.g. 429) to fail each of the first Sheets requests with; 0 lets one through")
+    args = parser.parse_args()
+
+    with SMTPSink() as sink, tempfile.TemporaryDirectory() as workdir:
+        os.environ.update({
+            "SMTP_HOST": sink.host,
+            "SMTP_PORT": str(sink.port),
+            "SMTP_STARTTLS": "false",
+            "GMAIL_PASSWORD": "",
+            "FROM_EMAIL": "bot@example.com",
+            "ADMIN_EMAIL": "admin@example.com",
+            "SHEET_CACHE_DIR": os.path.join(workdir, "cache"),
+            "LOG_DIR": os.path.join(workdir, "logs"),
+            "METRICS_DIR": os.path.join(workdir, "logs"),
+        })
+        for students in args.students:
+            errors = [status or None for status in args.sheets_errors]
+            result = bench(students, args.weeks, args.latency_ms / 1000, sink, workdir, errors)
+            print_table(students, args.weeks, result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+In-memory stand-ins for the parts of gspread that FP_bot uses.
+
+Every request that would hit the Sheets API is counted and can be slowed down
+by a configurable per-call latency, so benchmarks can measure both API-call
+counts and their effect on wall time without network access. Requests can
+also be made to fail with injected HTTP errors (e.g. 429 quota errors), raised
+as the same gspread APIError the real client raises.
+"""
+
+import time
+
+ERROR_STATUS = {400: "INVALID_ARGUMENT", 429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 502: "BAD_GATEWAY", 503: "UNAVAILABLE"}
+
+
+class FakeResponse:
+    """Just enough of a requests.Response for gspread's APIError"""
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = f"HTTP {status_code}"
+
+    def json(self):
+        return {"error": {"code": self.status_code, "message": f"Injected HTTP {self.status_code}",
+                          "status": ERROR_STATUS.get(self.status_code, "UNKNOWN")}}
+
+
+class CallCounter:
+    def __init__(self, latency=0.0, errors=None):
+        self.latency = latency  # Seconds added to every simulated API request
+        # HTTP status to fail each successive request with (None lets it through); used up in order
+        self.errors = list(errors or [])
+        self.calls = {}
+        self.failed = 0
+
+    def record(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+        status = self.errors.pop(0) if self.errors else None
+        if status is not None:
+            from gspread.exceptions import APIError
+
+            self.failed += 1
+            raise APIError(FakeResponse(status))
+
+    @property
+    def total(self):
+        return sum(self.calls.values())
+
+
+class FakeCell:
+    def __init__(self, row, col, value):
+        self.row = row
+        self.col = col
+        self.value = value
+
+
+class FakeWorksheet:
+    """Fake gspread Worksheet: col_values, row_values and cell, each counted as one API request"""
+
+    def __init__(self, title, rows, counter):
+        self.title = title
+        self.rows = rows
+        self.counter = counter
+
+    def col_values(self, col):
+        self.counter.record("col_values")
+        values = [row[col - 1] if len(row) >= col else "" for row in self.rows]
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def row_values(self, row):
+        self.counter.record("row_values")
+        values = list(self.rows[row - 1]) if 1 <= row <= len(self.rows) else []
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def cell(self, row, col):
+        self.counter.record("cell")
+        values = self.rows[row - 1] if 1 <= row <= len(self.rows) else []
+        return FakeCell(row, col, values[col - 1] if len(values) >= col else None)
+
+
+class FakeSpreadsheet:
+    def __init__(self, spreadsheet_id, worksheets, counter):
+        self.id = spreadsheet_id
+        self.title = f"Fake spreadsheet {spreadsheet_id}"
+        self.counter = counter
+        self.worksheets = {title: FakeWorksheet(title, rows, counter) for title, rows in worksheets.items()}
+
+    def worksheet(self, title):
+        self.counter.record("worksheet")
+        return self.worksheets[title]
+
+    def add_worksheet(self, title, rows, cols):
+        self.counter.record("add_worksheet")
+        self.worksheets[title] = FakeWorksheet(title, [], self.counter)
+        return self.worksheets[title]
+
+    def values_append(self, sheet_range, params=None, body=None):
+        self.counter.record("values_append")
+        title = sheet_range.partition("!")[0].strip("'")
+        if title not in self.worksheets:
+            from gspread.exceptions import APIError
+
+            raise APIError(FakeResponse(400))
+        self.worksheets[title].rows.extend(list(row) for row in (body or {}).get("values", []))
+        return {"updates": {"updatedRows": len((body or {}).get("values", []))}}
+
+    def values_batch_get(self, ranges, params=None):
+        self.counter.record("values_batch_get")
+        by_columns = (params or {}).get("majorDimension") == "COLUMNS"
+        value_ranges = []
+        for sheet_range in ranges:
+            title, _, cells = sheet_range.partition("!")
+            rows = self.worksheets[title.strip("'")].rows
+            if cells:
+                # Only single-column ranges such as "A:A" are used by FP_bot
+                col = ord(cells.split(":")[0]) - ord("A")
+                rows = [[row[col] if len(row) > col else ""] for row in rows]
+            rows = [list(row) for row in rows]
+            for row in rows:
+                while row and row[-1] == "":
+                    row.pop()
+            while rows and not rows[-1]:
+                rows.pop()
+            if by_columns:
+                width = max((len(row) for row in rows), default=0)
+                rows = [[row[c] if len(row) > c else "" for row in rows] for c in range(width)]
+                for column in rows:
+                    while column and column[-1] == "":
+                        column.pop()
+            value_ranges.append({"range": sheet_range, "values": rows})
+        return {"valueRanges": value_ranges}
+
+
+class FakeClient:
+    """Fake authenticated gspread client"""
+
+    def __init__(self, spreadsheets, latency=0.0, errors=None):
+        self.counter = CallCounter(latency, errors)
+        self.spreadsheets = spreadsheets  # spreadsheet id -> {worksheet title: rows}
+
+    def open_by_key(self, key):
+        self.counter.record("open_by_key")
+        return FakeSpreadsheet(key, self.spreadsheets[key], self.counter)
@@ -0,0 +1,82 @@
+"""
+Minimal local SMTP server that accepts and discards every message.
+
+Speaks just enough SMTP (EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT) for
+smtplib, without STARTTLS or AUTH, and counts connections and messages.
+Recipients listed in `reject` are refused with a permanent 550 error.
+"""
+
+import socketserver
+import threading
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        sink = self.server.sink
+        sink.record_connection()
+        self._reply("220 localhost SMTP sink ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self._reply("250 localhost")
+            elif command.startswith("RCPT") and sink.rejects(command):
+                self._reply("550 5.1.1 No such user")
+            elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                self._reply("250 OK")
+            elif command == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                sink.record_message()
+                self._reply("250 OK: queued")
+            elif command == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    def __init__(self, host="127.0.0.1", port=0, reject=()):
+        self.reject = {address.upper() for address in reject}
+        self.server = _Server((host, port), _SMTPHandler)
+        self.server.sink = self
+        self.host, self.port = self.server.server_address
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+
+    def rejects(self, rcpt_command):
+        address = rcpt_command.partition(":")[2].strip().strip("<>")
+        return address in self.reject
+
+    def record_connection(self):
+        with self.lock:
+            self.connections += 1
+
+    def record_message(self):
+        with self.lock:
+            self.messages += 1
+
+    def counts(self):
+        with self.lock:
+            return self.connections, self.messages
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.server.shutdown()
+        self.server.server_close()
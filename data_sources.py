@@ -0,0 +1,95 @@
+"""
+Where FP_bot reads its worksheets from.
+
+A data source is any object with a `load(titles)` method that returns a
+SheetSnapshot of those worksheets, and a `description` of where the last load
+came from (for the run log). FP_bot picks one from its flags - a CSV export,
+the local cache when offline, Google Sheets otherwise - or takes one passed in,
+e.g. a MemoryDataSource built from plain lists of rows. Nothing is read until
+FP_bot first needs the data.
+"""
+
+from sheet_cache import fingerprint, probe
+from sheet_snapshot import SheetSnapshot, WorksheetSnapshot
+
+
+class MemoryDataSource:
+    """Worksheets given as title -> list of rows"""
+
+    description = "Loaded worksheets from memory"
+
+    def __init__(self, worksheets):
+        self.worksheets = worksheets
+
+    def load(self, titles):
+        missing = [title for title in titles if title not in self.worksheets]
+        if missing:
+            raise KeyError(f"No rows given for worksheet(s): {', '.join(missing)}")
+        return SheetSnapshot({title: WorksheetSnapshot(title, self.worksheets[title]) for title in titles})
+
+
+class CsvDataSource:
+    """A CSV export of the worksheets (see SheetSnapshot.from_csv_dir)"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.description = f"Loaded worksheets from CSV export in {directory}"
+
+    def load(self, titles):
+        return SheetSnapshot.from_csv_dir(self.directory, titles)
+
+
+class CachedDataSource:
+    """The local sheet cache written by earlier online runs, without contacting Google Sheets"""
+
+    description = "Loaded worksheets from local cache (offline mode)"
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def load(self, titles):
+        worksheets = {}
+        for title in titles:
+            entry = self.cache.load(title) if self.cache else None
+            if entry is None:
+                raise ValueError(f"No cached copy of '{title}' - run once online (or pass --csv-dir) first")
+            worksheets[title] = WorksheetSnapshot(title, entry["rows"])
+        return SheetSnapshot(worksheets)
+
+
+class SheetsDataSource:
+    """
+    Google Sheets, through the local cache: the cached copy of a worksheet is used if the freshness
+    probe shows it is current, and only the worksheets that changed are downloaded, in a single
+    batched request.
+    """
+
+    def __init__(self, connect, cache, refresh=False):
+        self.connect = connect  # Returns the spreadsheet's SheetsClient; called on first load
+        self.cache = cache
+        self.refresh = refresh  # Ignore the cache and download every worksheet
+        self.description = ""
+
+    def load(self, titles):
+        spreadsheet = self.connect()
+        cached = {}
+        if not self.refresh:
+            cached = {title: self.cache.load(title) for title in titles}
+            cached = {title: entry for title, entry in cached.items() if entry is not None}
+
+        stale = list(titles)
+        if cached:
+            fingerprints = probe(spreadsheet, titles)
+            stale = [title for title in titles
+                     if title not in cached or cached[title]["fingerprint"] != fingerprints[title]]
+
+        worksheets = {title: WorksheetSnapshot(title, cached[title]["rows"])
+                      for title in titles if title not in stale}
+        if stale:
+            fetched = SheetSnapshot.fetch(spreadsheet, stale)
+            for title in stale:
+                worksheet = fetched.worksheet(title)
+                worksheets[title] = worksheet
+                self.cache.store(title, worksheet.rows, fingerprint(worksheet.col_values(1)))
+        self.description = f"Worksheets from cache: {len(titles) - len(stale)}, downloaded: {len(stale)}"
+        return SheetSnapshot(worksheets)
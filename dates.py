@@ -0,0 +1,81 @@
+"""
+Date normalization for the date columns of the worksheets.
+
+The date format of a column is detected once from all of its values, then the
+whole column is parsed in one pass into datetime.date objects; cells written in
+another format than the rest of the column are still parsed. Parsed values
+are memoized, so "1/5/2025" and "01/05/2025" compare equal and no value is
+parsed twice.
+"""
+
+from datetime import datetime
+from functools import lru_cache
+
+DATE_FORMATS = [
+    "%Y-%m-%d",      # 2024-01-15
+    "%d/%m/%Y",      # 15/01/2024
+    "%m/%d/%Y",      # 01/15/2024
+    "%d-%m-%Y",      # 15-01-2024
+    "%Y/%m/%d",      # 2024/01/15
+]
+
+
+@lru_cache(maxsize=None)
+def parse_date(value, fmt):
+    """Parse a date string with one format; returns None if it doesn't match. A trailing time is ignored."""
+    text = value.strip().split(" ")[0]
+    if not text:
+        return None
+    try:
+        return datetime.strptime(text, fmt).date()
+    except ValueError:
+        return None
+
+
+def detect_format(values):
+    """
+    Return the format that parses the most values of a column (None if none does).
+    Ties go to the earlier format in DATE_FORMATS, so ambiguous columns are read day-first.
+    """
+    best_format, best_count = None, 0
+    for fmt in DATE_FORMATS:
+        count = sum(1 for value in values if parse_date(value, fmt) is not None)
+        if count > best_count:
+            best_format, best_count = fmt, count
+    return best_format
+
+
+def parse_any(value, preferred_format=None):
+    """Parse a single date string, trying preferred_format first and then every known format"""
+    if preferred_format:
+        parsed = parse_date(value, preferred_format)
+        if parsed is not None:
+            return parsed
+    for fmt in DATE_FORMATS:
+        parsed = parse_date(value, fmt)
+        if parsed is not None:
+            return parsed
+    return None
+
+
+class DateColumn:
+    """A worksheet column parsed into dates (None where a cell is not a date)"""
+
+    def __init__(self, values):
+        self.values = values
+        self.format = detect_format(values)
+        # Cells in another format than the detected one (e.g. one ISO date in a day-first column)
+        # fall back to the other known formats
+        self.dates = [parse_any(value, self.format) if self.format else None for value in values]
+        self._first_index = {}
+        for index, parsed in enumerate(self.dates):
+            if parsed is not None:
+                self._first_index.setdefault(parsed, index)
+
+    def parse(self, value):
+        """Parse a date string, preferring this column's format"""
+        return parse_any(value, self.format)
+
+    def index(self, day):
+        """Index of the first cell holding the given date, or None"""
+        return self._first_index.get(day)
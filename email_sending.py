@@ -1,45 +1,257 @@
 
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import gspread
 import os
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 import sys
+import time
 import traceback
+from sheet_snapshot import SUMMARIES_SHEET, ATTENDANCE_SHEET
+from sheet_cache import SheetCache, DEFAULT_CACHE_DIR, probe
+from data_sources import CachedDataSource, CsvDataSource, SheetsDataSource
+from roster import RosterIndex
+from submissions import SubmissionsIndex
+from attendance_matrix import AttendanceMatrix
+from send_pipeline import SendResult, TokenBucket, failed_result
+from sheets_client import SheetsClient, DEFAULT_READS_PER_MINUTE, read_rate_limiter
+from status_sheet import StatusSheet
+from outbox import Outbox, DEFAULT_OUTBOX_DIR, drain
+from templates import ReminderTemplates
+from metrics import Metrics
+from run_log import RunLogger, DEFAULT_LOG_DIR, DEFAULT_BUFFER_LINES
+from send_ledger import SendLedger, DEFAULT_LEDGER_PATH, MISSED_CLASS_REMINDER, SUMMARY_REMINDER
+
+ADMIN_SUMMARY = "admin_summary"
+# How each kind of spooled message is called in the logs
+MESSAGE_KINDS = {
+    MISSED_CLASS_REMINDER: "Missed class reminder",
+    SUMMARY_REMINDER: "Email",
+    ADMIN_SUMMARY: "Admin summary",
+}
+
+# Ledger watermark: last attendance row whose class was fully processed
+ATTENDANCE_WATERMARK = "attendance_row"
 
 # Load environment variables
 load_dotenv()
 
 
+def service_account_client():
+    """Authenticate with the Google service account"""
+    # gspread (and google-auth) take a noticeable time to import; only load them when connecting
+    import gspread
+
+    # Try to use service account first
+    # Check for service account file in current directory or default location
+    service_account_path = 'service_account.json'
+    if os.path.exists(service_account_path):
+        return gspread.service_account(filename=service_account_path)
+    # Fall back to default location (~/.config/gspread/service_account.json)
+    return gspread.service_account()
+
+
+def sheets_rate_limiter_from_env():
+    """Token bucket for the Sheets read quota (SHEETS_READS_PER_MINUTE), shared by bots using one service account"""
+    return read_rate_limiter(float(os.getenv('SHEETS_READS_PER_MINUTE', str(DEFAULT_READS_PER_MINUTE))))
+
+
+def spreadsheet_id(spreadsheet_url):
+    """Extract the sheet ID from a URL of the form https://docs.google.com/spreadsheets/d/SHEET_ID/edit"""
+    if '/d/' in spreadsheet_url and '/edit' in spreadsheet_url:
+        return spreadsheet_url.split('/d/')[1].split('/')[0]
+    raise ValueError("Invalid SPREADSHEET_URL format. Expected: https://docs.google.com/spreadsheets/d/SHEET_ID/edit")
+
+
+def mail_transport_from_env(on_connect=None):
+    """Create an SMTP session; SMTP_HOST/SMTP_PORT/SMTP_STARTTLS allow pointing it at a local server"""
+    from mail_transport import MailTransport, SMTP_HOST, SMTP_PORT
+
+    from_email = os.getenv('FROM_EMAIL', "epc@meditationintelaviv.org")
+    return MailTransport(
+        from_email,
+        os.getenv('GMAIL_PASSWORD'),
+        host=os.getenv('SMTP_HOST', SMTP_HOST),
+        port=int(os.getenv('SMTP_PORT', str(SMTP_PORT))),
+        use_tls=os.getenv('SMTP_STARTTLS', 'true').lower() != 'false',
+        on_connect=on_connect,
+    )
+
+
+def mail_transport_pool_from_env(max_size=None):
+    """
+    SMTP sessions for several bots sending at once, each configured like mail_transport_from_env:
+    SMTP_SESSIONS of them (default 4), but no more than max_size
+    """
+    from mail_transport import MailTransportPool, DEFAULT_POOL_SIZE
+
+    size = int(os.getenv('SMTP_SESSIONS', str(DEFAULT_POOL_SIZE)))
+    return MailTransportPool(mail_transport_from_env, min(size, max_size) if max_size else size)
+
+
+def drain_outbox_from_env():
+    """
+    Send whatever a previous (crashed) run left in the outbox spool, without reading the sheet
+    or rendering anything. With STATUS_SHEET set, the reminders' results are appended to the status
+    worksheet afterwards. Returns the number of messages that could not be sent.
+    """
+    outbox = Outbox(os.getenv('OUTBOX_DIR', DEFAULT_OUTBOX_DIR))
+    ledger = SendLedger(os.getenv('SEND_LEDGER_PATH', DEFAULT_LEDGER_PATH))
+    status_title = os.getenv('STATUS_SHEET')
+    status_sheet = StatusSheet(status_title) if status_title else None
+    failed = 0
+    dead = 0
+
+    def on_result(item, result):
+        nonlocal failed, dead
+        kind = MESSAGE_KINDS.get(item.reminder_type, "Message")
+        if status_sheet is not None and item.reminder_type in (MISSED_CLASS_REMINDER, SUMMARY_REMINDER):
+            # The roster isn't read in this mode, so the student's name is left out
+            status_sheet.record(item.class_date, "", item.recipient, item.reminder_type, result)
+        if result.ok:
+            print(f"✅ {kind} sent successfully to {result.recipient}!")
+            if item.reminder_type in (MISSED_CLASS_REMINDER, SUMMARY_REMINDER):
+                ledger.record_sent(item.class_date, [item.recipient], item.reminder_type)
+        elif result.permanent:
+            dead += 1
+            print(f"❌ {kind} to {result.recipient} failed permanently, moved to {outbox.dead_letter_directory}: "
+                  f"{result.error}")
+        else:
+            failed += 1
+            print(f"❌ Error sending {kind.lower()} to {result.recipient}: {result.error}")
+
+    with mail_transport_from_env() as transport:
+        outcomes = drain(outbox, transport=transport, on_result=on_result,
+                         already_sent=lambda item: _already_sent(ledger, item))
+    ledger.close()
+    print(f"📤 Outbox drained: {len(outcomes) - failed - dead} sent, {failed} failed (kept for the next run), "
+          f"{dead} failed permanently")
+    if status_sheet is not None and status_sheet.rows:
+        _write_status_from_env(status_sheet)
+    return failed
+
+
+def _write_status_from_env(status_sheet):
+    """Append pending status rows to the spreadsheet configured in SPREADSHEET_URL; never raises"""
+    try:
+        sheets = SheetsClient.open(service_account_client(), spreadsheet_id(os.getenv('SPREADSHEET_URL', '')),
+                                   rate_limiter=sheets_rate_limiter_from_env(),
+                                   max_retries=int(os.getenv('SHEETS_MAX_RETRIES', '5')))
+        written = status_sheet.flush(sheets)
+        print(f"📝 Wrote {written} reminder status row(s) to '{status_sheet.title}'")
+    except Exception as e:
+        print(f"⚠️ Could not write {len(status_sheet.rows)} reminder status row(s) to '{status_sheet.title}': {e}")
+
+
+def _already_sent(ledger, item):
+    """Whether the ledger recorded a spooled reminder as sent (by a run that crashed before unspooling it)"""
+    return (item.reminder_type in (MISSED_CLASS_REMINDER, SUMMARY_REMINDER)
+            and ledger.was_sent(item.class_date, item.recipient, item.reminder_type))
+
+
 class FP_bot:
-    def __init__(self, debug_mode=False):
+    def __init__(self, debug_mode=False, offline=False, csv_dir=None, refresh=False, cohort=None, sa=None, mail=None,
+                 sheets_limiter=None, data_source=None):
+        """
+        offline: don't contact Google Sheets; read the worksheets from the local cache
+                 (or from csv_dir, a directory with a CSV export of both worksheets).
+        refresh: ignore the local cache and download both worksheets.
+        cohort:  per-course settings (name, spreadsheet_url, form_link, dropbox_link, admin_emails,
+                 ledger_path, outbox_dir, status_sheet); anything missing falls back to the environment variables.
+        sa, mail: an already authenticated gspread client and a MailTransportPool to share between bots.
+        sheets_limiter: token bucket for the Sheets read quota, shared between bots using the same `sa`.
+        data_source: where to read the worksheets from (see data_sources.py); overrides the flags above.
+
+        Nothing is connected or read here: the spreadsheet is opened and the worksheets are loaded
+        on first use, and the SMTP session is opened on the first send.
+        """
+        cohort = cohort or {}
+        self.name = cohort.get('name')
+        self.debug_mode = debug_mode
+        self.offline = offline or csv_dir is not None
+        self.csv_dir = csv_dir
+        self.refresh = refresh
+        # Execution log: streamed to logs/run*.jsonl, only the most recent lines are kept in memory
+        log_dir = os.getenv('LOG_DIR', DEFAULT_LOG_DIR)
+        self.logger = RunLogger(
+            os.path.join(log_dir, f"run-{self.name}.jsonl" if self.name else "run.jsonl"),
+            capacity=int(os.getenv('LOG_BUFFER_LINES', str(DEFAULT_BUFFER_LINES))),
+            cohort=self.name,
+        )
+        self.metrics = Metrics()  # Phase timings, request counters and send latencies of this run
+        self.sh = None  # SheetsClient: throttled, retrying access to the spreadsheet
+        self.sa = sa
+        self.sheets_limiter = sheets_limiter
+
+        self.form_link = cohort.get('form_link') or os.getenv('FORM_LINK', "https://docs.google.com/forms/d/e/1FAIpQLSexjnmtLgWdfkMYsg1l7jQLNL3x1EAyEDv-1zybspIL8JvrDQ/viewform")
+        self.dropbox_link = cohort.get('dropbox_link') or os.getenv('DROPBOX_LINK', "")
+        admin_emails = cohort.get('admin_emails')
+        if isinstance(admin_emails, list):
+            admin_emails = ",".join(admin_emails)
+        self.admin_email = admin_emails or os.getenv('ADMIN_EMAIL')
+
         # Use Google Sheets with authentication
-        spreadsheet_url = os.getenv('SPREADSHEET_URL')
+        spreadsheet_url = cohort.get('spreadsheet_url') or os.getenv('SPREADSHEET_URL')
         if not spreadsheet_url:
-            raise ValueError("SPREADSHEET_URL must be set in .env file")
-        
-        self.debug_mode = debug_mode
-        self.logs = []  # Store all execution logs
-        
-        # Extract sheet ID from URL
-        # URL format: https://docs.google.com/spreadsheets/d/SHEET_ID/edit
-        if '/d/' in spreadsheet_url and '/edit' in spreadsheet_url:
-            sheet_id = spreadsheet_url.split('/d/')[1].split('/')[0]
+            if csv_dir is None and data_source is None:
+                raise ValueError("SPREADSHEET_URL must be set in .env file")
+            sheet_id = None
         else:
-            raise ValueError("Invalid SPREADSHEET_URL format. Expected: https://docs.google.com/spreadsheets/d/SHEET_ID/edit")
-        
-        try:
-            # Try to use service account first
-            # Check for service account file in current directory or default location
-            service_account_path = 'service_account.json'
-            if os.path.exists(service_account_path):
-                self.sa = gspread.service_account(filename=service_account_path)
+            sheet_id = spreadsheet_id(spreadsheet_url)
+
+        self.sheet_id = sheet_id
+        self.cache = SheetCache(sheet_id, os.getenv('SHEET_CACHE_DIR', DEFAULT_CACHE_DIR)) if sheet_id else None
+        if data_source is None:
+            if csv_dir is not None:
+                data_source = CsvDataSource(csv_dir)
+            elif self.offline:
+                data_source = CachedDataSource(self.cache)
             else:
-                # Fall back to default location (~/.config/gspread/service_account.json)
-                self.sa = gspread.service_account()
-            self.sh = self.sa.open_by_key(sheet_id)
+                data_source = SheetsDataSource(self._spreadsheet, self.cache, refresh=refresh)
+        self.data_source = data_source
+        self.snapshot = None  # Both worksheets, loaded on first use
+
+        self.this_week = ''
+        self.last_week = ''
+        # SMTP session of this run, opened on first send; a pool passed in is closed by whoever created it
+        self.mail = mail.session(on_connect=self._count_smtp_connect) if mail is not None else None
+        self.owns_mail = mail is None
+        self.send_results = {}  # (message kind, recipient) -> SendResult, in send order
+        self.drained_paths = set()  # Spooled messages already tried in this run; not retried until the next one
+        # Concurrent sending: number of SMTP worker sessions and overall messages per second
+        self.send_workers = int(os.getenv('SEND_WORKERS', '1'))
+        self.send_rate = float(os.getenv('SEND_RATE_PER_SECOND', '2'))
+        # Record of sent reminders, so reruns never email the same student twice
+        self.ledger = SendLedger(cohort.get('ledger_path') or os.getenv('SEND_LEDGER_PATH', DEFAULT_LEDGER_PATH))
+        # Rendered messages waiting to be sent; survives a crash so the next run can resume
+        self.outbox = Outbox(cohort.get('outbox_dir') or os.getenv('OUTBOX_DIR', DEFAULT_OUTBOX_DIR))
+        # Optional worksheet that gets one row per reminder sent, written once at the end of the run
+        status_title = cohort.get('status_sheet') or os.getenv('STATUS_SHEET')
+        self.status_sheet = StatusSheet(status_title) if status_title else None
+        self.templates = ReminderTemplates(os.getenv('FROM_EMAIL', "epc@meditationintelaviv.org"),
+                                           self.form_link, self.dropbox_link)
+    
+    def _spreadsheet(self):
+        """Connect to the spreadsheet on first use; returns its SheetsClient"""
+        if self.sh is None:
+            with self.metrics.phase("connect"):
+                self._connect(self.sheet_id)
+        return self.sh
+
+    def probe_attendance(self):
+        """
+        Cheap change check: (filled rows, last value) of the attendance worksheet's column A, read with
+        a single small request and without loading the worksheets
+        """
+        return probe(self._spreadsheet(), [ATTENDANCE_SHEET])[ATTENDANCE_SHEET]
+
+    def _connect(self, sheet_id):
+        try:
+            if self.sa is None:
+                self.sa = service_account_client()
+            self.sh = SheetsClient.open(
+                self.sa, sheet_id,
+                rate_limiter=self.sheets_limiter or sheets_rate_limiter_from_env(),
+                max_retries=int(os.getenv('SHEETS_MAX_RETRIES', '5')),
+            )
             if self.debug_mode:
                 self._log(f"✅ Connected to Google Sheet: {self.sh.title}")
         except FileNotFoundError:
@@ -52,22 +264,81 @@ class FP_bot:
         except Exception as e:
             self._log(f"❌ Error connecting to Google Sheets: {e}")
             raise
-        
-        self.summaries = self.sh.worksheet("Form Responses 1")
-        self.attendance = self.sh.worksheet("Form Responses 2")
-        self.this_week = ''
-        self.last_week = ''
-    
+
     def _log(self, message):
         """Log a message and also print it"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"[{timestamp}] {message}"
-        self.logs.append(log_entry)
-        print(message)
+        self.logger.log(message)
+        print(f"[{self.name}] {message}" if self.name else message)
+
+    def load_sheets(self):
+        """Load both worksheets into memory from the data source and index them (done on first use)"""
+        with self.metrics.phase("load sheets"):
+            snapshot = self.data_source.load((SUMMARIES_SHEET, ATTENDANCE_SHEET))
+            self._roster = RosterIndex.from_worksheet(snapshot.worksheet(ATTENDANCE_SHEET))
+            self._submissions = SubmissionsIndex.from_worksheet(snapshot.worksheet(SUMMARIES_SHEET))
+        self.snapshot = snapshot
+        self._log(f"📂 {self.data_source.description}")
+
+    def _sheets(self):
+        if self.snapshot is None:
+            self.load_sheets()
+        return self.snapshot
+
+    @property
+    def summaries(self):
+        return self._sheets().worksheet(SUMMARIES_SHEET)
+
+    @property
+    def attendance(self):
+        return self._sheets().worksheet(ATTENDANCE_SHEET)
+
+    @property
+    def roster(self):
+        self._sheets()
+        return self._roster
+
+    @property
+    def submissions(self):
+        self._sheets()
+        return self._submissions
+
+    def _count_smtp_connect(self):
+        self.metrics.incr("smtp_connects")
+
+    def _new_mail_transport(self):
+        return mail_transport_from_env(on_connect=self._count_smtp_connect)
+
+    def _mail_transport(self):
+        """Return the shared SMTP session used for every outgoing message of this run"""
+        if self.mail is None:
+            self.mail = self._new_mail_transport()
+        return self.mail
+
+    def close_mail(self):
+        if self.mail is not None and self.owns_mail:
+            self.mail.close()
 
     def google_sheets_reading_date(self):
-        self.this_week = self.attendance.col_values(2)[-1]
-        self.last_week = self.attendance.col_values(2)[-2]
+        dates = self.attendance.col_values(2)
+        self.this_week = dates[-1]
+        self.last_week = dates[-2]
+
+    def _this_week_row(self):
+        """Sheet row of the most recent class in the attendance worksheet"""
+        return len(self.attendance.col_values(2))
+
+    def _class_already_processed(self):
+        return self._this_week_row() <= self.ledger.get_watermark(ATTENDANCE_WATERMARK)
+
+    def _class_dates(self):
+        """Attendance column 2 parsed into dates, with its format detected once for the whole column"""
+        return self.attendance.date_column(2)
+
+    def _as_date(self, date):
+        """Normalize a class date given as a sheet string (or already as a date) to a datetime.date"""
+        if isinstance(date, str):
+            return self._class_dates().parse(date)
+        return date
 
     def validate_recent_class(self):
         """
@@ -78,23 +349,7 @@ class FP_bot:
             return False
             
         try:
-            # Parse the date string (assuming format like "2024-01-15" or similar)
-            # Try different common date formats
-            date_formats = [
-                "%Y-%m-%d",      # 2024-01-15
-                "%d/%m/%Y",      # 15/01/2024
-                "%m/%d/%Y",      # 01/15/2024
-                "%d-%m-%Y",      # 15-01-2024
-                "%Y/%m/%d",      # 2024/01/15
-            ]
-            
-            class_date = None
-            for fmt in date_formats:
-                try:
-                    class_date = datetime.strptime(self.this_week, fmt).date()
-                    break
-                except ValueError:
-                    continue
+            class_date = self._as_date(self.this_week)
             
             if class_date is None:
                 self._log(f"❌ Unable to parse date format: {self.this_week}")
@@ -120,45 +375,35 @@ class FP_bot:
             return False
 
     def completed_students_emails(self, date):
-        list_of_completed_students_emails = []
-
-        indexes = [i for i, x in enumerate(self.summaries.col_values(6)) if x == date]
-        for ind in indexes:
-            list_of_completed_students_emails.append(self.summaries.row_values(ind + 1)[3].lower())
-
-        return list_of_completed_students_emails
+        class_date = self._as_date(date)
+        return list(self.submissions.submitters(class_date if class_date is not None else date))
 
     def missing_students_emails(self, date):
-        row_num = self.attendance.col_values(2).index(date) + 1
-        all_students = self.attendance.col_values(8)
-
-        present_students = self.attendance.cell(row_num, 3).value.split(", ")
-        missing_students = list(set(all_students) - set(present_students) - {""})
+        class_date = self._as_date(date)
+        index = self._class_dates().index(class_date) if class_date is not None else None
+        if index is None:
+            # Not a recognizable date - fall back to matching the cell text
+            index = self.attendance.col_values(2).index(date)
+        row_num = index + 1
 
+        present_students = self.attendance.cell_value(row_num, 3).split(", ")
+        missing_students = self.roster.missing_names(present_students)
 
         missing_students_emails = []
         for student in missing_students:
-            index = self.attendance.col_values(8).index(student)
-            missing_students_emails.append(self.attendance.col_values(7)[index].lower())
+            missing_students_emails.append(self.roster.email_for_name(student))
 
         return missing_students_emails
 
     def _get_student_name_by_email(self, email):
         """Get student name by email address"""
-        try:
-            # Get all emails from column 7
-            all_emails = [email.lower() for email in self.attendance.col_values(7)]
-            # Get all names from column 8
-            all_names = self.attendance.col_values(8)
-            
-            # Find the index of the email
-            if email.lower() in all_emails:
-                index = all_emails.index(email)
-                if index < len(all_names):
-                    return all_names[index]
-            return "Unknown"
-        except Exception:
-            return "Unknown"
+        self.metrics.incr("name_lookups")
+        return self.roster.name_for_email(email)
+
+    def _build_summary_reminder(self, to_email, date):
+        """Build the summary reminder message; returns (subject, body, message)"""
+        name = self._get_student_name_by_email(to_email)
+        return self.templates.summary_reminder(to_email, name, date)
 
     def send_email(self, to_email, date):
         """
@@ -169,44 +414,27 @@ class FP_bot:
         This is a follow-up reminder sent to students who were absent from a class
         and still need to submit their summary before attending the next class.
         """
-        # gmail-generated 16-digit password
-        link_to_form = os.getenv('FORM_LINK', "https://docs.google.com/forms/d/e/1FAIpQLSexjnmtLgWdfkMYsg1l7jQLNL3x1EAyEDv-1zybspIL8JvrDQ/viewform")
-        from_email = os.getenv('FROM_EMAIL', "epc@meditationintelaviv.org")
-        name = self._get_student_name_by_email(to_email)
-
-        subject = f"תזכורת לשליחת סיכום לשיעור {date}"
-        body = (f"שלום {name} :-) \nאנחנו רוצים להזכיר לך בעדינות לשלוח סיכום שיעור (עבור {date}) לפני השיעור הבא כדי"
-                f" שתוכל להשתתף בו כרגיל.\n\n"
-                f"{link_to_form}\n\n\nבאהבה,\nמיקי")
+        subject, body, message = self._build_summary_reminder(to_email, date)
 
         if self.debug_mode:
             self._log("=" * 60)
             self._log("DEBUG MODE - SUMMARY REMINDER EMAIL")
             self._log("=" * 60)
             self._log(f"To: {to_email}")
-            self._log(f"From: FP Kadampa TLV <{from_email}>")
+            self._log(f"From: {message['From']}")
             self._log(f"Subject: {subject}")
             self._log("-" * 40)
             self._log("Body:")
             self._log(body)
             self._log("=" * 60)
-            return
+            return None
 
-        message = MIMEMultipart()
-        message["From"] = f"FP Kadampa TLV <{from_email}>"
-        message["To"] = to_email
-        message["Subject"] = subject
-        message.attach(MIMEText(body, "plain"))
-        try:
-            server = smtplib.SMTP("smtp.gmail.com", 587)
-            server.starttls()
-            server.login(from_email, os.getenv('GMAIL_PASSWORD'))
-            server.send_message(message)
-            self._log(f"✅ Email sent successfully to {to_email}!")
-        except Exception as e:
-            self._log(f"❌ Error sending email to {to_email}: {e}")
-        finally:
-            server.quit()
+        return self._send_message(to_email, message, "Email")
+
+    def _build_missed_class_reminder(self, to_email, date):
+        """Build the missed class reminder message"""
+        name = self._get_student_name_by_email(to_email)
+        return self.templates.missed_class_reminder(to_email, name, date)
 
     def send_missed_class_reminder(self, to_email, date):
         """
@@ -216,61 +444,141 @@ class FP_bot:
         yesterday's class, providing them with class materials and summary form 
         to help them catch up before the next class.
         """
-        # gmail-generated 16-digit password
-        link_to_form = os.getenv('FORM_LINK', "https://docs.google.com/forms/d/e/1FAIpQLSexjnmtLgWdfkMYsg1l7jQLNL3x1EAyEDv-1zybspIL8JvrDQ/viewform")
-        dropbox_link = os.getenv('DROPBOX_LINK', "")
-        from_email = os.getenv('FROM_EMAIL', "epc@meditationintelaviv.org")
-        name = self._get_student_name_by_email(to_email)
-
-        subject = f"השלמת שיעור קדמפה FP"
-        body = (
-            f'<div dir="rtl" style="text-align:right; font-family:Arial, sans-serif;">'
-            f'שלום {name} :-)<br>'
-            f'שמנו לב שפספסת את השיעור האחרון ({date}). הנה הקלטת השיעור וטופס הסיכום שיעזרו לך להשלים:<br><br>'
-            f'<b>הקלטת השיעור:</b> <a href="{dropbox_link}">{dropbox_link}</a><br>'
-            f'<b>טופס הגשת סיכום:</b> <a href="{link_to_form}">{link_to_form}</a><br><br>'
-            f'אנא עיין בחומרים והגש את הסיכום שלך לפני השיעור הבא.<br><br>'
-            f'באהבה,<br>קדמפה בוט 🤖'
-            f'</div>'
-        )
-
         if self.debug_mode:
             self._log(f"would send missed class reminder to: {to_email}")
-            return
+            return None
+
+        message = self._build_missed_class_reminder(to_email, date)
+        return self._send_message(to_email, message, "Missed class reminder")
 
-        message = MIMEMultipart()
-        message["From"] = f"FP Kadampa TLV <{from_email}>"
-        message["To"] = to_email
-        message["Subject"] = subject
-        message.attach(MIMEText(body, "html"))
+    def _send_message(self, to_email, message, kind):
+        """Send one message over the shared SMTP session and log the outcome"""
+        start = time.perf_counter()
         try:
-            server = smtplib.SMTP("smtp.gmail.com", 587)
-            server.starttls()
-            server.login(from_email, os.getenv('GMAIL_PASSWORD'))
-            server.send_message(message)
-            self._log(f"✅ Missed class reminder sent successfully to {to_email}!")
+            self._mail_transport().send(message)
+            result = SendResult(to_email, True, None, time.perf_counter() - start)
         except Exception as e:
-            self._log(f"❌ Error sending missed class reminder to {to_email}: {e}")
-        finally:
-            server.quit()
+            result = failed_result(to_email, e, time.perf_counter() - start)
+        self._log_send_result(result, kind)
+        return result
 
-    def send_emails_loop(self, emails, date):
+    def _log_send_result(self, result, kind):
+        self.send_results[(kind, result.recipient)] = result
+        self.metrics.incr("smtp_sends" if result.ok else "smtp_send_errors")
+        self.metrics.observe("smtp_send", result.seconds)
+        if result.ok:
+            self._log(f"✅ {kind} sent successfully to {result.recipient}!")
+        else:
+            self._log(f"❌ Error sending {kind.lower()} to {result.recipient}: {result.error}")
+
+    def _render_to_outbox(self, emails, date, reminder_type, build_message):
+        """Render stage: write one message per recipient to the outbox spool"""
+        already_spooled = self.outbox.pending_keys()
+        dead_letters = self.outbox.dead_letter_keys()
         for email in emails:
-            if self.debug_mode:
+            if (date, email.lower(), reminder_type) in already_spooled:
+                self._log(f"⏭️ {MESSAGE_KINDS[reminder_type]} to {email} for {date} is already in the outbox")
+                continue
+            if (date, email.lower(), reminder_type) in dead_letters:
+                self._log(f"⏭️ {MESSAGE_KINDS[reminder_type]} to {email} for {date} already failed permanently")
+                continue
+            self.outbox.spool(build_message(email), date, reminder_type)
+
+    def drain_outbox(self):
+        """
+        Send stage: send everything in the outbox spool that wasn't tried yet in this run, recording
+        each sent reminder in the ledger
+        """
+        def on_result(item, result):
+            self.drained_paths.add(item.path)
+            self._log_send_result(result, MESSAGE_KINDS.get(item.reminder_type, "Message"))
+            if result.permanent:
+                self._log(f"🗑️ Moved to {self.outbox.dead_letter_directory}, it won't be retried")
+            if item.reminder_type not in (MISSED_CLASS_REMINDER, SUMMARY_REMINDER):
+                return
+            if result.ok:
+                self.ledger.record_sent(item.class_date, [item.recipient], item.reminder_type)
+            if self.status_sheet is not None:
+                self._record_status(item, result)
+
+        def select(item):
+            return item.path not in self.drained_paths
+
+        def already_sent(item):
+            return _already_sent(self.ledger, item)
+
+        if self.send_workers > 1:
+            # With a shared pool, the workers all send through it, so the pool's session cap holds across bots
+            transport_factory = self._new_mail_transport if self.owns_mail else self._mail_transport
+            outcomes = drain(self.outbox, transport_factory=transport_factory, workers=self.send_workers,
+                             rate_limiter=TokenBucket(self.send_rate, capacity=self.send_workers),
+                             on_result=on_result, select=select, already_sent=already_sent)
+        else:
+            outcomes = drain(self.outbox, transport=self._mail_transport(), on_result=on_result,
+                             select=select, already_sent=already_sent)
+        return outcomes
+
+    def _record_status(self, item, result):
+        """Queue a status row for a drained reminder; never raises, so the drain (and admin summary) goes on"""
+        try:
+            # Leftovers of an earlier run can be drained before (or without) the sheets being loaded:
+            # don't trigger a load from here, just leave the name out
+            name = self._get_student_name_by_email(item.recipient) if self.snapshot is not None else ""
+            self.status_sheet.record(item.class_date, name, item.recipient, item.reminder_type, result)
+        except Exception as e:
+            self._log(f"⚠️ Could not record reminder status for {item.recipient}: {e}")
+
+    def _skip_already_sent(self, emails, date, reminder_type):
+        """Drop recipients that the ledger says already got this reminder for this class"""
+        already_sent = self.ledger.sent_recipients(date, reminder_type)
+        remaining = []
+        for email in emails:
+            if email.lower() in already_sent:
+                self._log(f"⏭️ Skipping {email} - {reminder_type} reminder for {date} was already sent")
+            else:
+                remaining.append(email)
+        return remaining
+
+    def send_emails_loop(self, emails, date):
+        emails = self._skip_already_sent(emails, date, SUMMARY_REMINDER)
+        if self.debug_mode:
+            for email in emails:
                 name = self._get_student_name_by_email(email)
                 self._log(f"Sending summary reminder to {name} ({email}) for {date}")
-            else:
-                self._log(f"Processing summary reminder for {email} on {date}")
-                self.send_email(email, date)
+            return []
 
-    def send_missed_class_reminders_loop(self, emails, date):
         for email in emails:
-            if self.debug_mode:
+            self._log(f"Processing summary reminder for {email} on {date}")
+        self._render_to_outbox(emails, date, SUMMARY_REMINDER,
+                               lambda email: self._build_summary_reminder(email, date)[2])
+        return self._results_for(self.drain_outbox(), date, SUMMARY_REMINDER)
+
+    def send_missed_class_reminders_loop(self, emails, date):
+        emails = self._skip_already_sent(emails, date, MISSED_CLASS_REMINDER)
+        if self.debug_mode:
+            for email in emails:
                 name = self._get_student_name_by_email(email)
                 self._log(f"Sending missed class reminder to {name} ({email}) for {date}")
-            else:
-                self._log(f"Sending missed class reminder to {email} for {date}")
-            self.send_missed_class_reminder(email, date)
+                self.send_missed_class_reminder(email, date)
+            return []
+
+        for email in emails:
+            self._log(f"Sending missed class reminder to {email} for {date}")
+        self._render_to_outbox(emails, date, MISSED_CLASS_REMINDER,
+                               lambda email: self._build_missed_class_reminder(email, date))
+        return self._results_for(self.drain_outbox(), date, MISSED_CLASS_REMINDER)
+
+    @staticmethod
+    def _results_for(outcomes, date, reminder_type):
+        """Send results of one class's reminders, leaving out leftovers of earlier runs drained alongside them"""
+        return [result for item, result in outcomes if item.class_date == date and item.reminder_type == reminder_type]
+
+    def _send_status(self, kind, email):
+        """Short per-recipient delivery status for the admin summary"""
+        result = self.send_results.get((kind, email))
+        if result is None:
+            return ""
+        return " ✅" if result.ok else f" ❌ {result.error}"
 
     def send_admin_summary(self, missed_class_emails=None, summary_reminder_emails=None):
         """
@@ -282,7 +590,7 @@ class FP_bot:
         
         Supports multiple admin emails via comma-separated ADMIN_EMAIL env variable.
         """
-        admin_email_str = os.getenv('ADMIN_EMAIL')
+        admin_email_str = self.admin_email
         if not admin_email_str:
             self._log("⚠️ ADMIN_EMAIL not set in environment variables - skipping admin summary")
             return
@@ -306,42 +614,54 @@ class FP_bot:
         subject = f"📊 FP Bot Email Summary - {date_str}"
         
         # Build the summary content in English
-        summary_content = f"Hello,\n\nHere is the email sending summary for {date_str}:\n\n"
+        parts = [f"Hello,\n\nHere is the email sending summary for {date_str}:\n\n"]
         
         # Missed class reminders section
-        summary_content += f"📧 Missed class reminders ({date_str}): {len(missed_class_emails)}\n"
+        parts.append(f"📧 Missed class reminders ({date_str}): {len(missed_class_emails)}\n")
         if missed_class_emails:
             for email in missed_class_emails:
                 name = self._get_student_name_by_email(email)
-                summary_content += f"   - {name} ({email})\n"
+                status = self._send_status("Missed class reminder", email)
+                parts.append(f"   - {name} ({email}){status}\n")
         else:
-            summary_content += "   - No students missed the class\n"
+            parts.append("   - No students missed the class\n")
         
-        summary_content += "\n"
+        parts.append("\n")
         
         # Summary reminders section (currently commented out in code)
-        summary_content += f"📧 Summary reminders ({self.last_week if self.last_week else 'N/A'}): {len(summary_reminder_emails)}\n"
+        parts.append(f"📧 Summary reminders ({self.last_week if self.last_week else 'N/A'}): {len(summary_reminder_emails)}\n")
         if summary_reminder_emails:
             for email in summary_reminder_emails:
                 name = self._get_student_name_by_email(email)
-                summary_content += f"   - {name} ({email})\n"
+                status = self._send_status("Email", email)
+                parts.append(f"   - {name} ({email}){status}\n")
         else:
-            summary_content += "   - No students need summary reminders\n"
+            parts.append("   - No students need summary reminders\n")
+        
+        parts.append(f"\nTotal emails to send: {len(missed_class_emails) + len(summary_reminder_emails)}\n\n")
         
-        summary_content += f"\nTotal emails to send: {len(missed_class_emails) + len(summary_reminder_emails)}\n\n"
+        # Add run metrics section
+        parts.append("=" * 60 + "\n")
+        parts.append("⏱️ Run Metrics:\n")
+        parts.append("=" * 60 + "\n")
+        parts.append(self.metrics.table() + "\n\n")
         
-        # Add execution logs section
-        summary_content += "=" * 60 + "\n"
-        summary_content += "📋 Full Execution Logs:\n"
-        summary_content += "=" * 60 + "\n\n"
-        if self.logs:
-            for log_entry in self.logs:
-                summary_content += f"{log_entry}\n"
+        # Add execution logs section: only the most recent lines, the full log is in the uploaded log file
+        parts.append("=" * 60 + "\n")
+        if self.logger.dropped:
+            parts.append(f"📋 Execution Logs (last {len(self.logger.recent)} of {self.logger.total} lines):\n")
         else:
-            summary_content += "No logs available\n"
+            parts.append("📋 Full Execution Logs:\n")
+        parts.append("=" * 60 + "\n")
+        if self.logger.total:
+            parts.append(f"Log lines: {self.logger.counts_line()}\n\n")
+            parts.append("\n".join(self.logger.recent) + "\n")
+        else:
+            parts.append("\nNo logs available\n")
         
-        summary_content += "\n" + "=" * 60 + "\n"
-        summary_content += "Best regards,\nFP Kadampa Bot 🤖"
+        parts.append("\n" + "=" * 60 + "\n")
+        parts.append("Best regards,\nFP Kadampa Bot 🤖")
+        summary_content = "".join(parts)
         
         if self.debug_mode:
             self._log("=" * 60)
@@ -356,25 +676,14 @@ class FP_bot:
             self._log("=" * 60)
             return
         
-        # Send email to all admin emails
-        success_count = 0
+        # Spool one copy per admin and send everything still in the outbox
         for admin_email in admin_emails:
-            try:
-                message = MIMEMultipart()
-                message["From"] = f"FP Kadampa TLV <{from_email}>"
-                message["To"] = admin_email
-                message["Subject"] = subject
-                message.attach(MIMEText(summary_content, "plain"))
-                
-                server = smtplib.SMTP("smtp.gmail.com", 587)
-                server.starttls()
-                server.login(from_email, os.getenv('GMAIL_PASSWORD'))
-                server.send_message(message)
-                server.quit()
-                success_count += 1
-                self._log(f"✅ Admin summary sent successfully to {admin_email}!")
-            except Exception as e:
-                self._log(f"❌ Error sending admin summary to {admin_email}: {e}")
+            self.outbox.spool(self.templates.admin_summary(admin_email, subject, summary_content),
+                              date_str, ADMIN_SUMMARY)
+        outcomes = self.drain_outbox()
+        success_count = sum(1 for item, result in outcomes
+                            if item.reminder_type == ADMIN_SUMMARY and item.class_date == date_str
+                            and result.ok and item.recipient in admin_emails)
         
         if success_count == len(admin_emails):
             self._log(f"✅ Admin summary sent successfully to all {success_count} admin(s)!")
@@ -392,7 +701,8 @@ class FP_bot:
         
         try:
             self._log("🚀 Starting FP Bot execution...")
-            self.google_sheets_reading_date()
+            with self.metrics.phase("read dates"):
+                self.google_sheets_reading_date()
             
             if self.debug_mode:
                 self._log(f"📅 Current week: {self.this_week}")
@@ -400,14 +710,19 @@ class FP_bot:
                 self._log("")
             
             # Validate that there was a class in the last 7 days
-            if not self.validate_recent_class():
+            with self.metrics.phase("validate date"):
+                valid = self.validate_recent_class()
+            if not valid:
                 self._log("❌ There was no class in the last week, or I'm missing some data")
                 self._log(f"Last data is from: {self.this_week}")
                 # Still send admin summary even if validation fails
+            elif self._class_already_processed():
+                self._log(f"⏭️ Class {self.this_week} was already processed by a previous run - nothing new to send")
             else:
                 try:
-                    last_week_to_emails = list(set(self.missing_students_emails(self.last_week)) - set(self.completed_students_emails(self.last_week)))
-                    this_week_missing_emails = self.missing_students_emails(self.this_week)
+                    with self.metrics.phase("compute recipients"):
+                        last_week_to_emails = list(set(self.missing_students_emails(self.last_week)) - set(self.completed_students_emails(self.last_week)))
+                        this_week_missing_emails = self.missing_students_emails(self.this_week)
                     
                     # Store for admin summary
                     missed_class_emails = this_week_missing_emails
@@ -428,11 +743,17 @@ class FP_bot:
                                 self._log(f"   - {name} ({email})")
                         self._log("")
 
-                    # Send missed class reminders (day after class) - no need to check if summary was submitted
-                    self.send_missed_class_reminders_loop(this_week_missing_emails, self.this_week)
-                    
-                    # Send summary reminders for last week (only to those who haven't submitted)
-                    # self.send_emails_loop(last_week_to_emails, self.last_week)
+                    with self.metrics.phase("send reminders"):
+                        # Send missed class reminders (day after class) - no need to check if summary was submitted
+                        results = self.send_missed_class_reminders_loop(this_week_missing_emails, self.this_week)
+                        
+                        # Send summary reminders for last week (only to those who haven't submitted)
+                        # self.send_emails_loop(last_week_to_emails, self.last_week)
+
+                    # Only mark the class as done once no reminder is left to retry: each one went out or
+                    # failed permanently (those are in the dead-letter folder)
+                    if not self.debug_mode and all(result.ok or result.permanent for result in results):
+                        self.ledger.set_watermark(ATTENDANCE_WATERMARK, self._this_week_row())
                 except Exception as e:
                     self._log(f"❌ Error during email processing: {e}")
                     self._log(f"Traceback: {traceback.format_exc()}")
@@ -440,25 +761,142 @@ class FP_bot:
             self._log(f"❌ Critical error in run(): {e}")
             self._log(f"Traceback: {traceback.format_exc()}")
         finally:
-            # Always send admin summary, no matter what happened
-            self._log("📧 Sending admin summary email...")
-            try:
+            self._finish(missed_class_emails, summary_reminder_emails)
+
+    def _record_sheets_stats(self):
+        """Copy the Sheets client's request, retry and throttle statistics into the run metrics"""
+        if self.sh is None:
+            return
+        stats = self.sh.stats
+        for name in ("requests", "retries", "quota_errors", "server_errors", "throttled"):
+            self.metrics.incr(f"sheets_{name}", stats[name])
+        self.metrics.incr("sheets_throttle_ms", round(stats["throttle_seconds"] * 1000))
+        self.metrics.incr("sheets_backoff_ms", round(stats["backoff_seconds"] * 1000))
+
+    def _write_status(self):
+        """Append this run's reminder results to the status worksheet, all in a single request"""
+        if self.status_sheet is None or not self.status_sheet.rows:
+            return
+        if self.offline or self.sheet_id is None:
+            self._log(f"⚠️ Not writing {len(self.status_sheet.rows)} reminder status row(s) to "
+                      f"'{self.status_sheet.title}' - not connected to Google Sheets")
+            return
+        try:
+            with self.metrics.phase("status write-back"):
+                written = self.status_sheet.flush(self._spreadsheet())
+            self._log(f"📝 Wrote {written} reminder status row(s) to '{self.status_sheet.title}'")
+        except Exception as e:
+            self._log(f"⚠️ Could not write reminder status to '{self.status_sheet.title}': {e}")
+
+    def _drain_leftovers(self):
+        """
+        Send what earlier runs left in the outbox, if this run's reminder loops didn't already, so their
+        status rows are recorded before the status worksheet is written
+        """
+        if self.debug_mode:
+            return
+        try:
+            self.drain_outbox()
+        except Exception as e:
+            self._log(f"❌ Error draining the outbox: {e}")
+
+    def _finish(self, missed_class_emails, summary_reminder_emails):
+        self._drain_leftovers()
+        self._write_status()
+        self._record_sheets_stats()
+        self._log(f"📊 Google Sheets API calls this run: {self.metrics.count('sheets_requests')}"
+                  f" ({self.metrics.count('sheets_retries')} retried)")
+        # Always send admin summary, no matter what happened
+        self._log("📧 Sending admin summary email...")
+        try:
+            with self.metrics.phase("admin summary"):
                 self.send_admin_summary(missed_class_emails, summary_reminder_emails)
-            except Exception as e:
-                self._log(f"❌ Failed to send admin summary: {e}")
-                # Last resort - try to print the error
-                print(f"CRITICAL: Could not send admin summary: {e}")
+        except Exception as e:
+            self._log(f"❌ Failed to send admin summary: {e}")
+            # Last resort - try to print the error
+            print(f"CRITICAL: Could not send admin summary: {e}")
+        finally:
+            self.close_mail()
+            self.ledger.close()
+            self.write_metrics()
+            self.logger.close()
+
+    def backfill(self, send_reminders=False):
+        """
+        Whole-term mode: build the attendance and summary matrices from the full sheet history in one
+        pass and report on every past class (attendance rates, absence streaks, missing summaries).
+        With send_reminders, also send a summary reminder for every class before the latest one that a
+        student missed without submitting a summary, all rendered into the outbox and sent in one batch.
+        """
+        summary_reminder_emails = []
+
+        try:
+            self._log("🚀 Starting FP Bot backfill...")
+            with self.metrics.phase("build matrices"):
+                matrix = AttendanceMatrix.from_sheets(self.attendance, self.roster, self.submissions)
+            if matrix.classes:
+                self.this_week = matrix.classes[-1].label
+            self._log(matrix.report())
+
+            # The latest class's absentees just got the missed-class reminder; its summary isn't due yet
+            missing = matrix.unsubmitted_summaries(include_latest=not send_reminders)
+            summary_reminder_emails = list(missing)
+            if send_reminders:
+                # Group by class so every reminder carries the date of the class it is about
+                emails_by_class = {}
+                for email, classes in missing.items():
+                    for info in classes:
+                        emails_by_class.setdefault(info.label, []).append(email)
+
+                with self.metrics.phase("send reminders"):
+                    for label, emails in emails_by_class.items():
+                        emails = self._skip_already_sent(emails, label, SUMMARY_REMINDER)
+                        if self.debug_mode:
+                            self._log(f"would send {len(emails)} summary reminder(s) for {label}")
+                            continue
+                        self._render_to_outbox(emails, label, SUMMARY_REMINDER,
+                                               lambda email, label=label: self._build_summary_reminder(email, label)[2])
+                    if not self.debug_mode:
+                        self.drain_outbox()
+        except Exception as e:
+            self._log(f"❌ Critical error in backfill(): {e}")
+            self._log(f"Traceback: {traceback.format_exc()}")
+        finally:
+            self._finish([], summary_reminder_emails)
+
+    def write_metrics(self):
+        """Write this run's metrics as JSON into the logs directory uploaded by the workflow"""
+        filename = f"metrics-{self.name}.json" if self.name else "metrics.json"
+        path = os.path.join(os.getenv('METRICS_DIR', 'logs'), filename)
+        try:
+            self.metrics.write_json(path, cohort=self.name, class_date=self.this_week,
+                                    finished_at=datetime.now().isoformat(timespec="seconds"))
+        except OSError as e:
+            self._log(f"⚠️ Could not write metrics file {path}: {e}")
 
 
 if __name__ == "__main__":
     import sys
     
+    # Only send what a previous run left in the outbox, without touching the sheet
+    if "--drain-outbox" in sys.argv:
+        sys.exit(1 if drain_outbox_from_env() else 0)
+
     # Check for debug mode flag
     debug_mode = "--debug" in sys.argv or "-d" in sys.argv
+    offline = "--offline" in sys.argv
+    refresh = "--refresh" in sys.argv
+    csv_dir = None
+    if "--csv-dir" in sys.argv:
+        csv_dir = sys.argv[sys.argv.index("--csv-dir") + 1]
     
     if debug_mode:
         print("🐛 DEBUG MODE ENABLED - No emails will be sent")
         print("=" * 50)
     
-    fp_bot = FP_bot(debug_mode=debug_mode)
-    fp_bot.run()
+    fp_bot = FP_bot(debug_mode=debug_mode, offline=offline, csv_dir=csv_dir, refresh=refresh)
+    if "--backfill" in sys.argv:
+        # Report on (and with --send-reminders, send summary reminders for) every past class at once
+        fp_bot.backfill(send_reminders="--send-reminders" in sys.argv)
+    else:
+        fp_bot.run()
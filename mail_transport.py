@@ -0,0 +1,177 @@
+"""
+Reusable SMTP session for all outgoing mail.
+
+The transport connects, runs STARTTLS and logs in once, then sends every
+message of the run over the same session. It reconnects transparently when
+the server drops the session or after max_messages_per_connection messages.
+A transport can be shared between threads; sends are serialized on the session.
+To send from several threads at once, MailTransportPool keeps a small pool of
+sessions and hands each send the first free one.
+"""
+
+import smtplib
+import threading
+
+SMTP_HOST = "smtp.gmail.com"
+SMTP_PORT = 587
+# Gmail closes sessions after roughly 100 messages; reconnect before that happens
+MAX_MESSAGES_PER_CONNECTION = 90
+# Concurrent sessions a pool opens at most; Gmail refuses too many simultaneous logins per account
+DEFAULT_POOL_SIZE = 4
+
+
+class MailTransport:
+    def __init__(self, username, password, host=SMTP_HOST, port=SMTP_PORT,
+                 max_messages_per_connection=MAX_MESSAGES_PER_CONNECTION,
+                 use_tls=True, smtp_factory=smtplib.SMTP, on_connect=None):
+        self.username = username
+        self.password = password
+        self.host = host
+        self.port = port
+        self.max_messages_per_connection = max_messages_per_connection
+        self.use_tls = use_tls
+        self.smtp_factory = smtp_factory
+        self.on_connect = on_connect  # Called after every new authenticated session
+
+        self.server = None
+        self.lock = threading.RLock()
+        self.sent_on_connection = 0
+        self.connects = 0  # Number of SMTP sessions opened
+        self.sent = 0  # Number of messages sent
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _connect(self):
+        self._close()
+        server = self.smtp_factory(self.host, self.port)
+        try:
+            if self.use_tls:
+                server.starttls()
+            if self.password:
+                server.login(self.username, self.password)
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+            raise
+        self.server = server
+        self.sent_on_connection = 0
+        self.connects += 1
+        if self.on_connect is not None:
+            self.on_connect()
+
+    def send(self, message):
+        """Send a message, opening or renewing the session as needed"""
+        with self.lock:
+            self._send(message)
+
+    def _send(self, message):
+        if self.server is None or self.sent_on_connection >= self.max_messages_per_connection:
+            self._connect()
+        try:
+            self.server.send_message(message)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            self._resend_on_new_session(message)
+        except smtplib.SMTPResponseException as e:
+            # 421: service closing the transmission channel (e.g. per-session limit reached)
+            if e.smtp_code != 421:
+                raise
+            self._resend_on_new_session(message)
+        self.sent_on_connection += 1
+        self.sent += 1
+
+    def _resend_on_new_session(self, message):
+        self._connect()
+        self.server.send_message(message)
+
+    def close(self):
+        with self.lock:
+            self._close()
+
+    def _close(self):
+        if self.server is None:
+            return
+        server, self.server = self.server, None
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+
+class MailTransportPool:
+    """
+    Up to `size` SMTP sessions shared by several threads: each send takes a free session, opening
+    a new one while fewer than `size` exist and waiting for one to be released otherwise.
+    """
+
+    def __init__(self, transport_factory, size=DEFAULT_POOL_SIZE):
+        self.transport_factory = transport_factory  # Returns a new, not yet connected MailTransport
+        self.size = max(1, size)
+        self.transports = []
+        self.idle = []
+        self.condition = threading.Condition()
+
+    def _acquire(self):
+        with self.condition:
+            while not self.idle and len(self.transports) >= self.size:
+                self.condition.wait()
+            if self.idle:
+                return self.idle.pop()
+            transport = self.transport_factory()
+            self.transports.append(transport)
+            return transport
+
+    def _release(self, transport):
+        with self.condition:
+            self.idle.append(transport)
+            self.condition.notify()
+
+    def send(self, message, on_connect=None):
+        """Send a message over a free session; on_connect is called if a session had to be (re)opened for it"""
+        transport = self._acquire()
+        try:
+            # The session is ours alone until it is released, so its callback can be swapped per send
+            transport.on_connect = on_connect
+            transport.send(message)
+        finally:
+            transport.on_connect = None
+            self._release(transport)
+
+    def session(self, on_connect=None):
+        """A handle for one user of the pool (e.g. one bot) that reports its own new sessions to on_connect"""
+        return PooledSession(self, on_connect)
+
+    @property
+    def connects(self):
+        return sum(transport.connects for transport in self.transports)
+
+    @property
+    def sent(self):
+        return sum(transport.sent for transport in self.transports)
+
+    def close(self):
+        with self.condition:
+            for transport in self.transports:
+                transport.close()
+
+
+class PooledSession:
+    """Sends through a MailTransportPool; closing it is left to whoever created the pool"""
+
+    def __init__(self, pool, on_connect=None):
+        self.pool = pool
+        self.on_connect = on_connect
+
+    def send(self, message):
+        self.pool.send(message, on_connect=self.on_connect)
+
+    def close(self):
+        pass
@@ -0,0 +1,116 @@
+"""
+Run instrumentation: phase timers, counters and latency histograms.
+
+A Metrics object collects per-run numbers (how long each phase of run() took,
+how many Sheets requests and SMTP connections/sends were made, how long each
+send took). A phase that runs inside another one (e.g. connecting while the
+sheets load on first use) is only counted in the inner phase, so the phase
+times add up to the run's wall time. It renders a compact text table for the admin summary and writes a
+JSON file for the workflow's log artifact.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (in milliseconds) of the latency histogram buckets
+LATENCY_BUCKETS_MS = (10, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Metrics:
+    def __init__(self):
+        self.phases = {}  # phase name -> seconds, in the order the phases ran
+        self.counters = {}
+        self.samples = {}  # histogram name -> list of seconds
+        self.lock = threading.Lock()
+        self._local = threading.local()  # Per thread: stack of [phase name, time spent in nested phases]
+
+    @contextmanager
+    def phase(self, name):
+        stack = self._local.__dict__.setdefault("stack", [])
+        frame = [name, 0.0]
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            if stack:
+                stack[-1][1] += elapsed
+            with self.lock:
+                self.phases[name] = self.phases.get(name, 0.0) + elapsed - frame[1]
+
+    def incr(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def count(self, name):
+        return self.counters.get(name, 0)
+
+    def observe(self, name, seconds):
+        with self.lock:
+            self.samples.setdefault(name, []).append(seconds)
+
+    def histogram(self, name):
+        """Summary of a latency histogram: count, p50/p95/max in ms and per-bucket counts"""
+        values = sorted(seconds * 1000 for seconds in self.samples.get(name, []))
+        buckets = {}
+        for bound in LATENCY_BUCKETS_MS:
+            buckets[f"<={bound}ms"] = 0
+        buckets[f">{LATENCY_BUCKETS_MS[-1]}ms"] = 0
+        for value in values:
+            for bound in LATENCY_BUCKETS_MS:
+                if value <= bound:
+                    buckets[f"<={bound}ms"] += 1
+                    break
+            else:
+                buckets[f">{LATENCY_BUCKETS_MS[-1]}ms"] += 1
+        return {
+            "count": len(values),
+            "p50_ms": round(_percentile(values, 0.5), 1),
+            "p95_ms": round(_percentile(values, 0.95), 1),
+            "max_ms": round(values[-1], 1) if values else 0.0,
+            "buckets": buckets,
+        }
+
+    def to_dict(self):
+        return {
+            "phases_ms": {name: round(seconds * 1000, 1) for name, seconds in self.phases.items()},
+            "counters": dict(self.counters),
+            "histograms": {name: self.histogram(name) for name in self.samples},
+        }
+
+    def table(self):
+        """Compact plain-text metrics table"""
+        lines = [f"{'Phase':<28}{'ms':>10}"]
+        for name, seconds in self.phases.items():
+            lines.append(f"{name:<28}{seconds * 1000:>10.1f}")
+        if self.counters:
+            lines.append("")
+            lines.append(f"{'Counter':<28}{'value':>10}")
+            for name, value in self.counters.items():
+                lines.append(f"{name:<28}{value:>10}")
+        for name in self.samples:
+            summary = self.histogram(name)
+            lines.append("")
+            lines.append(f"{name}: n={summary['count']} p50={summary['p50_ms']}ms "
+                         f"p95={summary['p95_ms']}ms max={summary['max_ms']}ms")
+            lines.append("  " + " ".join(f"{bucket}:{n}" for bucket, n in summary["buckets"].items() if n))
+        return "\n".join(lines)
+
+    def write_json(self, path, **extra):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        data = dict(extra)
+        data.update(self.to_dict())
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
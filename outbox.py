@@ -0,0 +1,156 @@
+"""
+On-disk outbox spool of rendered messages.
+
+Sending is split in two stages. First every message is rendered and written
+to the spool as an .eml file, with the class date and reminder type in
+X-FP-* headers. Then the spool is drained: each message is deleted from the
+spool as soon as it was sent and its result recorded. A run that crashes
+partway through leaves the unsent messages in the spool, and the next drain
+picks them up without re-rendering anything or reading the sheet again.
+Messages that fail permanently (e.g. the recipient doesn't exist) are moved to
+a dead-letter directory instead of being retried on every run.
+"""
+
+import itertools
+import os
+import time
+import uuid
+from collections import namedtuple
+
+from send_pipeline import SendResult, failed_result, send_concurrently
+
+DEFAULT_OUTBOX_DIR = "outbox"
+DEAD_LETTER_DIR = "dead"  # Subdirectory of the outbox for messages that failed permanently
+CLASS_DATE_HEADER = "X-FP-Class-Date"
+REMINDER_TYPE_HEADER = "X-FP-Reminder-Type"
+
+SpooledMessage = namedtuple("SpooledMessage", ["path", "recipient", "class_date", "reminder_type", "message"])
+
+
+class Outbox:
+    def __init__(self, directory=DEFAULT_OUTBOX_DIR):
+        self.directory = directory
+        self.dead_letter_directory = os.path.join(directory, DEAD_LETTER_DIR)
+        self._sequence = itertools.count()
+
+    def spool(self, message, class_date, reminder_type):
+        """Write a rendered message to the spool; returns its path"""
+        os.makedirs(self.directory, exist_ok=True)
+        message[CLASS_DATE_HEADER] = class_date
+        message[REMINDER_TYPE_HEADER] = reminder_type
+        # Names sort in spool order: render time, then a per-process sequence number
+        name = f"{time.time_ns():020d}-{next(self._sequence):06d}-{uuid.uuid4().hex[:8]}.eml"
+        path = os.path.join(self.directory, name)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(message.as_bytes())
+        os.replace(tmp_path, path)
+        return path
+
+    def pending(self):
+        """Return every message still in the spool, oldest first"""
+        return self._read(self.directory)
+
+    def dead_letters(self):
+        """Return every message that failed permanently, oldest first"""
+        return self._read(self.dead_letter_directory)
+
+    def _read(self, directory):
+        if not os.path.isdir(directory):
+            return []
+        # The email parser is only needed (and imported) when there is something to send
+        import email
+        import email.policy
+
+        spooled = []
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".eml"):
+                continue
+            path = os.path.join(directory, name)
+            with open(path, "rb") as f:
+                message = email.message_from_binary_file(f, policy=email.policy.compat32)
+            spooled.append(SpooledMessage(
+                path, message["To"], message[CLASS_DATE_HEADER], message[REMINDER_TYPE_HEADER], message))
+        return spooled
+
+    def pending_keys(self):
+        """(class date, lowercased recipient, reminder type) of every message still in the spool"""
+        return {(item.class_date, item.recipient.lower(), item.reminder_type) for item in self.pending()}
+
+    def dead_letter_keys(self):
+        """(class date, lowercased recipient, reminder type) of every message that failed permanently"""
+        return {(item.class_date, item.recipient.lower(), item.reminder_type) for item in self.dead_letters()}
+
+    def mark_sent(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def dead_letter(self, path):
+        """Move a message that failed permanently out of the spool, so it is not retried"""
+        os.makedirs(self.dead_letter_directory, exist_ok=True)
+        try:
+            os.replace(path, os.path.join(self.dead_letter_directory, os.path.basename(path)))
+        except FileNotFoundError:
+            pass
+
+    def settle(self, item, result):
+        """Take a message out of the spool once its outcome is final; transient failures stay for a retry"""
+        if result.ok:
+            self.mark_sent(item.path)
+        elif result.permanent:
+            self.dead_letter(item.path)
+
+
+def _strip_spool_headers(message):
+    del message[CLASS_DATE_HEADER]
+    del message[REMINDER_TYPE_HEADER]
+    return message
+
+
+def drain(outbox, transport=None, transport_factory=None, workers=1, rate_limiter=None, on_result=None,
+          select=None, already_sent=None):
+    """
+    Send the messages in the spool and take each one out of the spool as soon as its outcome is recorded.
+
+    With workers <= 1 messages go out one by one over `transport`; otherwise they are sent
+    concurrently, each worker using its own transport from `transport_factory`.
+    on_result(spooled_message, send_result) is called for every message from the calling thread,
+    before the message leaves the spool: a crash in between leaves it in the spool rather than
+    losing its record. Messages failing permanently are moved to the dead-letter directory.
+    select(spooled_message) limits the drain to some messages; already_sent(spooled_message)
+    tells which messages were recorded as sent before a crash, which are dropped without sending.
+    Returns the list of (spooled_message, send_result) pairs.
+    """
+    items = [item for item in outbox.pending() if select is None or select(item)]
+    if already_sent is not None:
+        for item in [item for item in items if already_sent(item)]:
+            outbox.mark_sent(item.path)
+            items.remove(item)
+    if not items:
+        return []
+
+    def finish(item, result):
+        if on_result is not None:
+            on_result(item, result)
+        outbox.settle(item, result)
+
+    if workers <= 1:
+        outcomes = []
+        for item in items:
+            start = time.perf_counter()
+            try:
+                transport.send(_strip_spool_headers(item.message))
+                result = SendResult(item.recipient, True, None, time.perf_counter() - start)
+            except Exception as e:
+                result = failed_result(item.recipient, e, time.perf_counter() - start)
+            outcomes.append((item, result))
+            finish(item, result)
+        return outcomes
+
+    results = send_concurrently(
+        [(item.recipient, _strip_spool_headers(item.message)) for item in items],
+        transport_factory, workers=workers, rate_limiter=rate_limiter,
+        on_result=lambda index, result: finish(items[index], result))
+    return list(zip(items, results))
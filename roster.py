@@ -0,0 +1,69 @@
+"""
+Precomputed lookups over the student roster (attendance sheet columns 7 and 8).
+
+The roster is indexed once per run so that resolving a name or email is a
+dict lookup instead of a scan over the whole column.
+"""
+
+EMAIL_COLUMN = 7
+NAME_COLUMN = 8
+
+
+def normalize_name(name):
+    """Normalize a student name for matching: trim, collapse whitespace, ignore case"""
+    return " ".join(name.split()).casefold()
+
+
+class RosterIndex:
+    def __init__(self, emails, names):
+        self.names = []  # Roster names in sheet order
+        self.email_to_name = {}
+        self.name_to_email = {}
+        self.normalized_name_to_row = {}
+        self.row_to_email = {}
+
+        for index, name in enumerate(names):
+            if not name:
+                continue
+            email = emails[index].strip().lower() if index < len(emails) else ""
+            row = index + 1
+            self.names.append(name)
+            self.row_to_email[row] = email
+            # First occurrence wins, like a list.index() lookup would
+            self.name_to_email.setdefault(name, email)
+            self.normalized_name_to_row.setdefault(normalize_name(name), row)
+            if email:
+                self.email_to_name.setdefault(email, name)
+
+    @classmethod
+    def from_worksheet(cls, worksheet):
+        return cls(worksheet.col_values(EMAIL_COLUMN), worksheet.col_values(NAME_COLUMN))
+
+    def __len__(self):
+        return len(self.names)
+
+    def name_for_email(self, email, default="Unknown"):
+        return self.email_to_name.get(email.strip().lower(), default)
+
+    def email_for_name(self, name):
+        """Return the lowercased email of a student, matching the name exactly or after normalization"""
+        if name in self.name_to_email:
+            return self.name_to_email[name]
+        row = self.row_for_name(name)
+        return self.row_to_email[row] if row is not None else None
+
+    def row_for_name(self, name):
+        return self.normalized_name_to_row.get(normalize_name(name))
+
+    def missing_names(self, present_names):
+        """Return roster names (in sheet order) that do not appear in present_names"""
+        present = {normalize_name(name) for name in present_names if name.strip()}
+        seen = set()
+        missing = []
+        for name in self.names:
+            key = normalize_name(name)
+            if key in present or key in seen:
+                continue
+            seen.add(key)
+            missing.append(name)
+        return missing
@@ -0,0 +1,99 @@
+"""
+Run the FP bot for several courses (cohorts) at once from one config file.
+
+Config file format (JSON):
+
+    {
+      "cohorts": [
+        {
+          "name": "tlv-fp-2025",
+          "spreadsheet_url": "https://docs.google.com/spreadsheets/d/SHEET_ID/edit",
+          "form_link": "https://docs.google.com/forms/d/e/FORM_ID/viewform",
+          "dropbox_link": "https://www.dropbox.com/sh/FOLDER",
+          "admin_emails": ["admin@example.com"],
+          "status_sheet": "Reminder Status"
+        }
+      ]
+    }
+
+Any setting a cohort leaves out falls back to the environment variables used by
+email_sending.py. All cohorts share one Google service account client (and its
+Sheets read quota) and a pool of up to SMTP_SESSIONS (default 4) SMTP sessions,
+and run in parallel. With a session per cohort sending at the same time, the
+total time is close to the slowest cohort.
+
+Usage:
+    python run_cohorts.py cohorts.json [--debug] [--workers N]
+"""
+
+import argparse
+import json
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from email_sending import (FP_bot, service_account_client, mail_transport_pool_from_env,
+                           sheets_rate_limiter_from_env)
+
+DEFAULT_CONFIG_PATH = "cohorts.json"
+
+
+def load_cohorts(config_path):
+    with open(config_path, encoding="utf-8") as f:
+        config = json.load(f)
+    cohorts = config.get("cohorts", [])
+    if not cohorts:
+        raise ValueError(f"No cohorts found in {config_path}")
+    for index, cohort in enumerate(cohorts):
+        if not cohort.get("spreadsheet_url"):
+            raise ValueError(f"Cohort #{index + 1} in {config_path} has no spreadsheet_url")
+        cohort.setdefault("name", f"cohort-{index + 1}")
+        # Each course gets its own ledger: the same student can be in more than one course
+        cohort.setdefault("ledger_path", f"send_ledger_{cohort['name']}.sqlite3")
+        cohort.setdefault("outbox_dir", f"outbox/{cohort['name']}")
+    return cohorts
+
+
+def run_cohort(cohort, debug_mode, sa, mail, sheets_limiter):
+    try:
+        bot = FP_bot(debug_mode=debug_mode, cohort=cohort, sa=sa, mail=mail, sheets_limiter=sheets_limiter)
+        bot.run()
+        return True
+    except Exception as e:
+        print(f"[{cohort['name']}] ❌ Cohort failed: {e}")
+        print(traceback.format_exc())
+        return False
+
+
+def run_cohorts(config_path, debug_mode=False, workers=None):
+    """Run every cohort in the config in parallel; returns the number of cohorts that failed"""
+    cohorts = load_cohorts(config_path)
+    sa = service_account_client()
+    # No more SMTP sessions than cohorts sending at the same time
+    mail = mail_transport_pool_from_env(max_size=min(workers or len(cohorts), len(cohorts)))
+    # The Sheets read quota is per service account, so every cohort draws from the same bucket
+    sheets_limiter = sheets_rate_limiter_from_env()
+    try:
+        with ThreadPoolExecutor(max_workers=workers or len(cohorts)) as pool:
+            results = list(pool.map(lambda cohort: run_cohort(cohort, debug_mode, sa, mail, sheets_limiter),
+                                 cohorts))
+    finally:
+        mail.close()
+
+    failed = [cohort["name"] for cohort, ok in zip(cohorts, results) if not ok]
+    print(f"🏁 Finished {len(cohorts)} cohort(s), {len(failed)} failed{': ' + ', '.join(failed) if failed else ''}")
+    return len(failed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the FP bot for every cohort in a config file")
+    parser.add_argument("config", nargs="?", default=DEFAULT_CONFIG_PATH)
+    parser.add_argument("-d", "--debug", action="store_true", help="print emails instead of sending them")
+    parser.add_argument("--workers", type=int, default=None, help="cohorts to run at the same time (default: all)")
+    args = parser.parse_args()
+
+    if args.debug:
+        print("🐛 DEBUG MODE ENABLED - No emails will be sent")
+        print("=" * 50)
+
+    sys.exit(1 if run_cohorts(args.config, debug_mode=args.debug, workers=args.workers) else 0)
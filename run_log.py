@@ -0,0 +1,77 @@
+"""
+Bounded, streaming run logger.
+
+Every log line is streamed as a JSON object to a .jsonl file in the logs
+directory the workflow uploads. Only the most recent lines are kept in memory
+(a ring buffer) together with per-level counts, which is all the admin
+summary needs, so memory stays bounded however long the run is.
+"""
+
+import json
+import os
+import threading
+from collections import Counter, deque
+from datetime import datetime
+
+DEFAULT_LOG_DIR = "logs"
+DEFAULT_BUFFER_LINES = 500
+
+# Log level inferred from the emoji a message starts with
+LEVEL_PREFIXES = (("❌", "error"), ("⚠️", "warning"), ("✅", "success"))
+
+
+def message_level(message):
+    for prefix, level in LEVEL_PREFIXES:
+        if message.startswith(prefix):
+            return level
+    return "info"
+
+
+class RunLogger:
+    def __init__(self, path=None, capacity=DEFAULT_BUFFER_LINES, cohort=None):
+        self.path = path
+        self.cohort = cohort
+        self.recent = deque(maxlen=capacity)  # Formatted "[timestamp] message" lines
+        self.counts = Counter()  # level -> number of lines
+        self.total = 0
+        self.lock = threading.Lock()
+        self._file = None
+
+    def _stream(self):
+        if self._file is None and self.path:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        return self._file
+
+    def log(self, message):
+        """Record a message; returns the formatted line"""
+        now = datetime.now()
+        level = message_level(message)
+        line = f"[{now.strftime('%Y-%m-%d %H:%M:%S')}] {message}"
+        entry = {"ts": now.isoformat(timespec="seconds"), "level": level, "message": message}
+        if self.cohort:
+            entry["cohort"] = self.cohort
+        with self.lock:
+            self.recent.append(line)
+            self.counts[level] += 1
+            self.total += 1
+            stream = self._stream()
+            if stream is not None:
+                stream.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                stream.flush()
+        return line
+
+    @property
+    def dropped(self):
+        """Number of lines that fell out of the in-memory buffer"""
+        return self.total - len(self.recent)
+
+    def counts_line(self):
+        return ", ".join(f"{self.counts[level]} {level}" for level in ("error", "warning", "success", "info")
+                         if self.counts[level])
+
+    def close(self):
+        with self.lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,83 @@
+"""
+SQLite-backed record of the reminders that were already sent.
+
+Every successful send is stored keyed on (class date, recipient, reminder type),
+so a rerun for the same class never emails the same student twice. The ledger
+also keeps named watermarks, such as the last attendance row that was fully
+processed, so later runs can skip classes that are already done.
+"""
+
+import sqlite3
+from datetime import datetime
+
+DEFAULT_LEDGER_PATH = "send_ledger.sqlite3"
+
+MISSED_CLASS_REMINDER = "missed_class"
+SUMMARY_REMINDER = "summary"
+
+
+class SendLedger:
+    def __init__(self, path=DEFAULT_LEDGER_PATH):
+        self.path = path
+        self._conn = None  # Opened on first use
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path)
+            self._create_tables()
+        return self._conn
+
+    def _create_tables(self):
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sent ("
+                " class_date TEXT NOT NULL,"
+                " recipient TEXT NOT NULL,"
+                " reminder_type TEXT NOT NULL,"
+                " sent_at TEXT NOT NULL,"
+                " PRIMARY KEY (class_date, recipient, reminder_type))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS watermarks (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def sent_recipients(self, class_date, reminder_type):
+        """Return the set of recipients that already got this reminder for this class"""
+        rows = self.conn.execute(
+            "SELECT recipient FROM sent WHERE class_date = ? AND reminder_type = ?",
+            (class_date, reminder_type),
+        )
+        return {row[0] for row in rows}
+
+    def was_sent(self, class_date, recipient, reminder_type):
+        row = self.conn.execute(
+            "SELECT 1 FROM sent WHERE class_date = ? AND recipient = ? AND reminder_type = ?",
+            (class_date, recipient.lower(), reminder_type),
+        ).fetchone()
+        return row is not None
+
+    def record_sent(self, class_date, recipients, reminder_type):
+        sent_at = datetime.now().isoformat(timespec="seconds")
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO sent (class_date, recipient, reminder_type, sent_at) VALUES (?, ?, ?, ?)",
+                [(class_date, recipient.lower(), reminder_type, sent_at) for recipient in recipients],
+            )
+
+    def get_watermark(self, name, default=0):
+        row = self.conn.execute("SELECT value FROM watermarks WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else default
+
+    def set_watermark(self, name, value):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO watermarks (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+                (name, value),
+            )
@@ -0,0 +1,119 @@
+"""
+Concurrent, rate-limited sending of a batch of email messages.
+
+Messages are sent by a pool of worker threads, each with its own SMTP session
+(smtplib connections are not thread safe). A shared token bucket caps the
+overall sending rate so the batch stays under Gmail's sending quotas.
+"""
+
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Outcome of sending one message; error is None on success, seconds is the time the send took and
+# permanent tells whether the failure will happen again on retry (e.g. the recipient doesn't exist)
+SendResult = namedtuple("SendResult", ["recipient", "ok", "error", "seconds", "permanent"], defaults=[0.0, False])
+
+
+def is_permanent_error(error):
+    """
+    Whether a send failure is permanent: the recipient refused with a 5xx reply, or no recipient at
+    all. Login, sender (e.g. daily sending limit exceeded) and connection errors affect every message
+    and go away once fixed, so they are worth retrying, like 4xx replies.
+    """
+    import smtplib
+
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        # Refused with 4xx codes only (e.g. mailbox busy) is temporary; an empty dict means no recipients
+        return not error.recipients or any(code >= 500 for code, _ in error.recipients.values())
+    return False
+
+
+def failed_result(recipient, error, seconds):
+    return SendResult(recipient, False, str(error), seconds, is_permanent_error(error))
+
+
+class TokenBucket:
+    """Thread-safe token bucket: allows `rate` acquisitions per second with bursts of up to `capacity`"""
+
+    def __init__(self, rate, capacity=1, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.nominal_rate = rate  # The rate it was created with; users that slow the bucket down restore it
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated_at = clock()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self):
+        """Block until a token is available and take it; returns the time spent waiting"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            self.sleep(delay)
+            waited += delay
+
+
+def send_concurrently(messages, transport_factory, workers=4, rate_limiter=None, on_result=None):
+    """
+    Send (recipient, message) pairs over a pool of worker threads.
+
+    Each worker opens its own transport via transport_factory() and reuses it for
+    every message it sends. on_result(index, result) is called from the calling thread
+    as each send completes, so it can use thread-bound resources such as a SQLite
+    connection. Returns one SendResult per message, in input order.
+    """
+    messages = list(messages)
+    if not messages:
+        return []
+
+    local = threading.local()
+    transports = []
+    transports_lock = threading.Lock()
+
+    def worker_transport():
+        if not hasattr(local, "transport"):
+            local.transport = transport_factory()
+            with transports_lock:
+                transports.append(local.transport)
+        return local.transport
+
+    def send_one(index):
+        recipient, message = messages[index]
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        start = time.perf_counter()
+        try:
+            worker_transport().send(message)
+            result = SendResult(recipient, True, None, time.perf_counter() - start)
+        except Exception as e:
+            result = failed_result(recipient, e, time.perf_counter() - start)
+        return result
+
+    results = [None] * len(messages)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(messages)))) as pool:
+            futures = {pool.submit(send_one, index): index for index in range(len(messages))}
+            for future in as_completed(futures):
+                index = futures[future]
+                results[index] = future.result()
+                if on_result is not None:
+                    on_result(index, results[index])
+        return results
+    finally:
+        for transport in transports:
+            transport.close()
@@ -0,0 +1,71 @@
+"""
+Local on-disk cache of worksheet values.
+
+Each worksheet is stored as a gzip-compressed JSON file keyed by spreadsheet
+ID and worksheet title, together with a fingerprint of its form-response
+column (number of filled cells in column A and the last value). A cheap probe
+that reads only column A of every worksheet in one request decides whether
+the cached copy is still current.
+"""
+
+import gzip
+import json
+import os
+import re
+
+DEFAULT_CACHE_DIR = ".sheet_cache"
+PROBE_COLUMN = "A"  # Google Forms timestamp column, grows by one cell per response
+
+
+def fingerprint(column_values):
+    """Fingerprint of a worksheet from its probe column: (filled row count, last value)"""
+    return [len(column_values), column_values[-1] if column_values else ""]
+
+
+def probe(spreadsheet, titles):
+    """Read only the probe column of every worksheet in a single request; returns title -> fingerprint"""
+    ranges = [f"'{title}'!{PROBE_COLUMN}:{PROBE_COLUMN}" for title in titles]
+    response = spreadsheet.values_batch_get(ranges, params={"majorDimension": "COLUMNS"})
+    fingerprints = {}
+    for title, value_range in zip(titles, response.get("valueRanges", [])):
+        columns = value_range.get("values", [])
+        values = list(columns[0]) if columns else []
+        while values and values[-1] == "":
+            values.pop()
+        fingerprints[title] = fingerprint(values)
+    return fingerprints
+
+
+class SheetCache:
+    def __init__(self, spreadsheet_id, directory=DEFAULT_CACHE_DIR):
+        self.spreadsheet_id = spreadsheet_id
+        self.directory = directory
+
+    def path(self, title):
+        safe_title = re.sub(r"[^A-Za-z0-9_-]+", "_", title)
+        return os.path.join(self.directory, f"{self.spreadsheet_id}__{safe_title}.json.gz")
+
+    def load(self, title):
+        """Return the cached entry {"rows": [...], "fingerprint": [...]} for a worksheet, or None"""
+        try:
+            with gzip.open(self.path(title), "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("spreadsheet_id") != self.spreadsheet_id or entry.get("worksheet") != title:
+            return None
+        return entry
+
+    def store(self, title, rows, worksheet_fingerprint):
+        os.makedirs(self.directory, exist_ok=True)
+        entry = {
+            "spreadsheet_id": self.spreadsheet_id,
+            "worksheet": title,
+            "fingerprint": worksheet_fingerprint,
+            "rows": rows,
+        }
+        # Write to a temporary file first so an interrupted run never leaves a truncated cache
+        tmp_path = self.path(title) + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.path(title))
@@ -0,0 +1,93 @@
+"""
+In-memory snapshot of the bot's Google Sheets worksheets.
+
+All worksheets are downloaded with a single values:batchGet request, and the
+bot answers every query from memory instead of issuing a Sheets API request
+per col_values / row_values / cell call.
+"""
+
+import csv
+import glob
+import os
+
+from dates import DateColumn
+
+SUMMARIES_SHEET = "Form Responses 1"
+ATTENDANCE_SHEET = "Form Responses 2"
+
+
+class WorksheetSnapshot:
+    """Read-only copy of a worksheet's values, mirroring the gspread Worksheet read API"""
+
+    def __init__(self, title, rows):
+        self.title = title
+        self.rows = [list(row) for row in rows]
+        self._columns = {}
+        self._date_columns = {}
+
+    def col_values(self, col):
+        """Return the values of a column (1-based), like gspread: trailing empty cells are dropped"""
+        if col not in self._columns:
+            values = [row[col - 1] if len(row) >= col else "" for row in self.rows]
+            while values and values[-1] == "":
+                values.pop()
+            self._columns[col] = values
+        return list(self._columns[col])
+
+    def date_column(self, col):
+        """Return a column (1-based) parsed into dates; the format is detected once per column"""
+        if col not in self._date_columns:
+            self._date_columns[col] = DateColumn(self.col_values(col))
+        return self._date_columns[col]
+
+    def row_values(self, row):
+        """Return the values of a row (1-based)"""
+        if 1 <= row <= len(self.rows):
+            return list(self.rows[row - 1])
+        return []
+
+    def cell_value(self, row, col):
+        """Return the value of a single cell (1-based), or an empty string if it is blank"""
+        values = self.row_values(row)
+        return values[col - 1] if len(values) >= col else ""
+
+
+class SheetSnapshot:
+    """Snapshot of several worksheets of one spreadsheet, keyed by worksheet title"""
+
+    def __init__(self, worksheets):
+        self.worksheets = worksheets
+
+    @classmethod
+    def fetch(cls, spreadsheet, titles=(SUMMARIES_SHEET, ATTENDANCE_SHEET)):
+        """Download all the given worksheets with a single batched read"""
+        ranges = [f"'{title}'" for title in titles]
+        response = spreadsheet.values_batch_get(ranges)
+        value_ranges = response.get("valueRanges", [])
+        worksheets = {}
+        for title, value_range in zip(titles, value_ranges):
+            worksheets[title] = WorksheetSnapshot(title, value_range.get("values", []))
+        return cls(worksheets)
+
+    @classmethod
+    def from_csv_dir(cls, directory, titles=(SUMMARIES_SHEET, ATTENDANCE_SHEET)):
+        """
+        Load worksheets from a CSV export. Each worksheet is read from "<title>.csv", or from
+        "<spreadsheet name> - <title>.csv" as produced by Google Sheets' "Download as CSV".
+        """
+        worksheets = {}
+        for title in titles:
+            path = os.path.join(directory, f"{title}.csv")
+            if not os.path.exists(path):
+                matches = sorted(glob.glob(os.path.join(glob.escape(directory), f"* - {glob.escape(title)}.csv")))
+                if not matches:
+                    raise FileNotFoundError(f"No CSV export found for worksheet '{title}' in {directory}")
+                path = matches[0]
+            with open(path, newline="", encoding="utf-8-sig") as f:
+                worksheets[title] = WorksheetSnapshot(title, csv.reader(f))
+        return cls(worksheets)
+
+    def worksheet(self, title):
+        if title not in self.worksheets:
+            raise KeyError(f"Worksheet '{title}' is not part of the snapshot")
+        return self.worksheets[title]
@@ -0,0 +1,164 @@
+"""
+Quota-aware access to the Google Sheets API.
+
+Sheets allows a limited number of read requests per minute (60 per user per
+project by default), answers with HTTP 429 once that quota is used up and
+returns the occasional 5xx. SheetsClient wraps a gspread Spreadsheet so that
+every request:
+
+- is throttled by a token bucket refilled at the per-minute read quota, which
+  can be shared by every bot using the same service account;
+- is retried on 429, 5xx and network errors with jittered exponential backoff,
+  waiting at least as long as the API's Retry-After header asks;
+- slows the shared bucket down after a 429 and speeds it back up as requests
+  succeed again.
+
+Reads go out as values:batchGet requests, so callers ask for every range they
+need in a single request. Retry and throttle statistics are kept in `stats`.
+"""
+
+import random
+import threading
+import time
+
+from send_pipeline import TokenBucket
+
+DEFAULT_READS_PER_MINUTE = 60
+DEFAULT_BURST = 10  # Requests that may go out back to back before throttling starts
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+
+def status_code(error):
+    """HTTP status of a failed Sheets request (gspread APIError), or None"""
+    code = getattr(error, "code", None)
+    if isinstance(code, int) and code > 0:
+        return code
+    return getattr(getattr(error, "response", None), "status_code", None)
+
+
+def retry_after(error):
+    """Seconds the API asked us to wait before retrying, or None"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    # requests' ConnectionError and Timeout are OSErrors
+    return status_code(error) in RETRYABLE_STATUS or isinstance(error, OSError)
+
+
+def read_rate_limiter(reads_per_minute=DEFAULT_READS_PER_MINUTE, burst=DEFAULT_BURST):
+    """
+    Token bucket for the Sheets read quota; share one between all bots using the same service account.
+    Its nominal_rate (the quota) is what clients recover to after slowing it down on a 429.
+    """
+    return TokenBucket(reads_per_minute / 60, capacity=burst)
+
+
+class SheetsClient:
+    def __init__(self, spreadsheet=None, rate_limiter=None, max_retries=5, base_delay=1.0, max_delay=64.0,
+                 sleep=time.sleep, rng=None):
+        self.spreadsheet = spreadsheet
+        self.rate_limiter = rate_limiter or read_rate_limiter()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+        self.lock = threading.Lock()
+        self.stats = {
+            "requests": 0,  # Requests sent, including the ones that failed and were retried
+            "retries": 0,
+            "quota_errors": 0,  # 429 responses
+            "server_errors": 0,  # 5xx responses and network errors
+            "throttled": 0,  # Requests that had to wait for the token bucket
+            "throttle_seconds": 0.0,
+            "backoff_seconds": 0.0,
+        }
+
+    @classmethod
+    def open(cls, client, key, **kwargs):
+        """Open a spreadsheet by key through an authenticated gspread client, with the same retries"""
+        sheets = cls(**kwargs)
+        sheets.spreadsheet = sheets.call(client.open_by_key, key)
+        return sheets
+
+    @property
+    def title(self):
+        return self.spreadsheet.title
+
+    def _count(self, name, amount=1):
+        with self.lock:
+            self.stats[name] += amount
+
+    def _throttle(self):
+        waited = self.rate_limiter.acquire()
+        if waited:
+            self._count("throttled")
+            self._count("throttle_seconds", waited)
+
+    def _slow_down(self):
+        """Halve the request rate after a 429 (never below one request per minute)"""
+        with self.rate_limiter.lock:
+            self.rate_limiter.rate = max(1 / 60, self.rate_limiter.rate / 2)
+
+    def _speed_up(self):
+        """Recover a tenth of the bucket's nominal rate per successful request, up to that rate"""
+        # The nominal rate is kept on the (shared) bucket: a client created while another one had slowed
+        # the bucket down must not take the lowered rate as its target
+        bucket = self.rate_limiter
+        with bucket.lock:
+            if bucket.rate < bucket.nominal_rate:
+                bucket.rate = min(bucket.nominal_rate, bucket.rate + bucket.nominal_rate / 10)
+
+    def backoff_delay(self, attempt, error=None):
+        """Full-jitter exponential backoff, but never shorter than the Retry-After the API sent"""
+        delay = self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        requested = retry_after(error)
+        if requested is not None:
+            delay = max(delay, min(requested, self.max_delay))
+        return delay
+
+    def call(self, function, *args, **kwargs):
+        """Call a Sheets API function with throttling and retries"""
+        attempt = 0
+        while True:
+            self._throttle()
+            self._count("requests")
+            try:
+                result = function(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                if status_code(e) == 429:
+                    self._count("quota_errors")
+                    self._slow_down()
+                else:
+                    self._count("server_errors")
+                delay = self.backoff_delay(attempt, e)
+                self._count("retries")
+                self._count("backoff_seconds", delay)
+                self.sleep(delay)
+                attempt += 1
+                continue
+            self._speed_up()
+            return result
+
+    def values_batch_get(self, ranges, params=None):
+        """Read several ranges in one values:batchGet request"""
+        return self.call(self.spreadsheet.values_batch_get, ranges, params=params)
+
+    def values_append(self, sheet_range, rows):
+        """
+        Append rows after the last row of a range's table in one values:append request. Note that a
+        retried append may be applied twice if the failed attempt did reach the sheet.
+        """
+        return self.call(self.spreadsheet.values_append, sheet_range,
+                         params={"valueInputOption": "RAW", "insertDataOption": "INSERT_ROWS"},
+                         body={"values": rows})
+
+    def add_worksheet(self, title, rows, cols):
+        return self.call(self.spreadsheet.add_worksheet, title, rows=rows, cols=cols)
@@ -0,0 +1,44 @@
+"""
+Write-back of reminder status to the spreadsheet.
+
+The result of every reminder sent during a run is collected in memory and
+appended to a status worksheet with a single values:append request at the end
+of the run, so the cost is one Sheets request per run however many students
+were emailed. The worksheet (with a header row) is created the first time.
+"""
+
+from datetime import datetime
+
+from sheets_client import status_code
+
+STATUS_HEADER = ["Class date", "Student", "Email", "Reminder type", "Result", "Timestamp"]
+
+
+class StatusSheet:
+    def __init__(self, title):
+        self.title = title
+        self.rows = []  # Pending status rows, in send order
+
+    def record(self, class_date, name, email, reminder_type, result):
+        outcome = "sent" if result.ok else f"failed: {result.error}"
+        self.rows.append([class_date, name or "", email, reminder_type, outcome,
+                          datetime.now().isoformat(timespec="seconds")])
+
+    def flush(self, sheets):
+        """Append every pending row in one request (two more the first time, to create the worksheet)"""
+        if not self.rows:
+            return 0
+        rows, self.rows = self.rows, []
+        try:
+            try:
+                sheets.values_append(f"'{self.title}'!A1", rows)
+            except Exception as e:
+                # The API answers 400 ("Unable to parse range") when the worksheet doesn't exist yet
+                if status_code(e) != 400:
+                    raise
+                sheets.add_worksheet(self.title, rows=len(rows) + 1, cols=len(STATUS_HEADER))
+                sheets.values_append(f"'{self.title}'!A1", [STATUS_HEADER] + rows)
+        except Exception:
+            self.rows = rows + self.rows  # Keep them for another attempt
+            raise
+        return len(rows)
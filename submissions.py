@@ -0,0 +1,40 @@
+"""
+Index of summary submissions ("Form Responses 1") by class date.
+
+Built in a single pass over the summaries snapshot so that the submitters of
+any class, including older weeks, can be answered without further reads.
+Class dates are normalized to datetime.date, so differently formatted
+spellings of the same date match; cells that aren't dates are kept as text.
+"""
+
+from dates import DateColumn
+
+EMAIL_COLUMN = 4
+DATE_COLUMN = 6
+
+
+class SubmissionsIndex:
+    def __init__(self, rows, date_column=None):
+        self.by_date = {}  # class date (datetime.date, or raw text) -> set of lowercased submitter emails
+        if date_column is None:
+            date_column = DateColumn([row[DATE_COLUMN - 1] if len(row) >= DATE_COLUMN else "" for row in rows])
+        for index, row in enumerate(rows):
+            if len(row) < DATE_COLUMN:
+                continue
+            email = row[EMAIL_COLUMN - 1].strip().lower()
+            if not email:
+                continue
+            parsed = date_column.dates[index] if index < len(date_column.dates) else None
+            key = parsed if parsed is not None else row[DATE_COLUMN - 1]
+            self.by_date.setdefault(key, set()).add(email)
+
+    @classmethod
+    def from_worksheet(cls, worksheet):
+        return cls(worksheet.rows, worksheet.date_column(DATE_COLUMN))
+
+    def submitters(self, date):
+        """Return the set of lowercased emails that submitted a summary for the given class date (a datetime.date)"""
+        return set(self.by_date.get(date, ()))
+
+    def has_submitted(self, email, date):
+        return email.strip().lower() in self.by_date.get(date, ())
@@ -0,0 +1,67 @@
+"""
+Email templates, compiled once per run.
+
+The parts of each message that are the same for every recipient (sender,
+form and Dropbox links) are substituted when ReminderTemplates is created,
+so rendering a message only fills in the student's name and the class date.
+"""
+
+from string import Template
+
+MISSED_CLASS_SUBJECT = "השלמת שיעור קדמפה FP"
+MISSED_CLASS_BODY = Template(
+    '<div dir="rtl" style="text-align:right; font-family:Arial, sans-serif;">'
+    'שלום ${name} :-)<br>'
+    'שמנו לב שפספסת את השיעור האחרון (${date}). הנה הקלטת השיעור וטופס הסיכום שיעזרו לך להשלים:<br><br>'
+    '<b>הקלטת השיעור:</b> <a href="${dropbox_link}">${dropbox_link}</a><br>'
+    '<b>טופס הגשת סיכום:</b> <a href="${form_link}">${form_link}</a><br><br>'
+    'אנא עיין בחומרים והגש את הסיכום שלך לפני השיעור הבא.<br><br>'
+    'באהבה,<br>קדמפה בוט 🤖'
+    '</div>'
+)
+
+SUMMARY_REMINDER_SUBJECT = Template("תזכורת לשליחת סיכום לשיעור ${date}")
+SUMMARY_REMINDER_BODY = Template(
+    "שלום ${name} :-) \nאנחנו רוצים להזכיר לך בעדינות לשלוח סיכום שיעור (עבור ${date}) לפני השיעור הבא כדי"
+    " שתוכל להשתתף בו כרגיל.\n\n"
+    "${form_link}\n\n\nבאהבה,\nמיקי"
+)
+
+
+def _bind(template, **values):
+    """Substitute the per-run values into a template, leaving the per-recipient placeholders"""
+    # Escape "$" in the values so they survive being compiled into a new Template
+    escaped = {key: value.replace("$", "$$") for key, value in values.items()}
+    return Template(template.safe_substitute(**escaped))
+
+
+class ReminderTemplates:
+    def __init__(self, from_email, form_link, dropbox_link):
+        self.from_header = f"FP Kadampa TLV <{from_email}>"
+        self.missed_class_body = _bind(MISSED_CLASS_BODY, form_link=form_link, dropbox_link=dropbox_link)
+        self.summary_reminder_body = _bind(SUMMARY_REMINDER_BODY, form_link=form_link)
+
+    def _message(self, to_email, subject, body, subtype):
+        # The MIME classes are only imported once a message is actually rendered
+        from email.mime.multipart import MIMEMultipart
+        from email.mime.text import MIMEText
+
+        message = MIMEMultipart()
+        message["From"] = self.from_header
+        message["To"] = to_email
+        message["Subject"] = subject
+        message.attach(MIMEText(body, subtype))
+        return message
+
+    def missed_class_reminder(self, to_email, name, date):
+        body = self.missed_class_body.substitute(name=name, date=date)
+        return self._message(to_email, MISSED_CLASS_SUBJECT, body, "html")
+
+    def summary_reminder(self, to_email, name, date):
+        """Returns (subject, body, message)"""
+        subject = SUMMARY_REMINDER_SUBJECT.substitute(date=date)
+        body = self.summary_reminder_body.substitute(name=name, date=date)
+        return subject, body, self._message(to_email, subject, body, "plain")
+
+    def admin_summary(self, to_email, subject, content):
+        return self._message(to_email, subject, content, "plain")
@@ -0,0 +1,138 @@
+"""
+Watch mode: keep running and send reminders shortly after a class is recorded.
+
+Instead of waiting for the weekly cron run, the watcher polls the attendance
+worksheet with the cheapest request there is: column A of that worksheet only
+(FP_bot.probe_attendance). It compares the number of filled rows with the
+ledger's watermark of the last fully processed class row. Only when a new
+class row shows up is a full FP_bot run started. That run reads the sheet
+through the local cache (downloading only the worksheets that changed) and
+skips anyone already recorded in the send ledger. While nothing changes, the
+poll interval grows up to --max-interval, so an idle watcher costs one small
+read every few minutes and never loads the worksheets.
+
+With a cohorts config file (see run_cohorts.py) every cohort is watched from
+the same event loop, sharing one service account client and one Sheets read
+quota.
+
+Usage:
+    python watch.py [cohorts.json] [--interval 60] [--max-interval 300] [--retry-minutes 30] [--debug]
+"""
+
+import argparse
+import asyncio
+import signal
+import time
+
+from email_sending import FP_bot, ATTENDANCE_WATERMARK, service_account_client, sheets_rate_limiter_from_env
+from run_cohorts import load_cohorts
+
+DEFAULT_INTERVAL = 60  # Seconds between polls right after a change
+DEFAULT_MAX_INTERVAL = 300  # Longest wait between polls while nothing changes
+DEFAULT_RETRY_MINUTES = 30  # How long to wait before retrying a class whose run didn't send everything
+IDLE_BACKOFF = 1.5  # Growth of the poll interval per idle poll
+
+
+class Watcher:
+    def __init__(self, cohort=None, debug_mode=False, sa=None, sheets_limiter=None, interval=DEFAULT_INTERVAL,
+                 max_interval=DEFAULT_MAX_INTERVAL, retry_seconds=DEFAULT_RETRY_MINUTES * 60):
+        self.cohort = cohort
+        self.debug_mode = debug_mode
+        self.sa = sa
+        self.sheets_limiter = sheets_limiter
+        self.interval = interval
+        self.max_interval = max(interval, max_interval)
+        self.retry_seconds = retry_seconds
+        # Only used to probe the sheet and read the watermark; it never loads the worksheets
+        self.bot = FP_bot(debug_mode=debug_mode, cohort=cohort, sa=sa, sheets_limiter=sheets_limiter)
+        self.attempted = None  # Probe result the last run was started for
+        self.attempted_at = 0.0
+        self.retry = False  # Whether some message of the last run failed to send
+        self.polls = 0
+        self.runs = 0
+
+    def _log(self, message):
+        print(f"[{self.bot.name}] {message}" if self.bot.name else message)
+
+    def _should_run(self, current):
+        rows, _ = current
+        if rows <= self.bot.ledger.get_watermark(ATTENDANCE_WATERMARK):
+            return False  # Every class up to the last row was already processed
+        if current != self.attempted:
+            return True
+        # Nothing new since the last run. Retry now and then if it didn't get every message out; a run
+        # that had nothing to send (e.g. the class is too old) is not repeated.
+        return self.retry and time.monotonic() - self.attempted_at >= self.retry_seconds
+
+    def _run_bot(self):
+        """Run the bot for the latest class; returns whether any message failed to send"""
+        # A fresh bot per class, so metrics, logs and the admin summary cover that class only. Runs are
+        # days apart, so each opens (and closes) its own SMTP session rather than keeping one idle.
+        bot = FP_bot(debug_mode=self.debug_mode, cohort=self.cohort, sa=self.sa, sheets_limiter=self.sheets_limiter)
+        bot.run()
+        return any(not result.ok for result in bot.send_results.values())
+
+    async def watch(self, stop):
+        """Poll until `stop` is set, running the bot whenever a new class row appears"""
+        self._log(f"👀 Watching for new classes (polling every {self.interval}-{self.max_interval}s)")
+        delay = self.interval
+        while not stop.is_set():
+            ran = False
+            try:
+                current = await asyncio.to_thread(self.bot.probe_attendance)
+                self.polls += 1
+                if self._should_run(current):
+                    self._log(f"🆕 Attendance row {current[0]} ({current[1]}) is new - running the bot")
+                    self.attempted, self.attempted_at = current, time.monotonic()
+                    self.retry = await asyncio.to_thread(self._run_bot)
+                    self.runs += 1
+                    ran = True
+            except Exception as e:
+                self._log(f"⚠️ Poll failed, will try again: {e}")
+
+            delay = self.interval if ran else min(self.max_interval, delay * IDLE_BACKOFF)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+        requests = self.bot.sh.stats["requests"] if self.bot.sh is not None else 0
+        self._log(f"🛑 Stopped after {self.polls} poll(s) ({requests} Sheets request(s)) and {self.runs} run(s)")
+        self.bot.ledger.close()
+
+
+async def watch_all(cohorts, debug_mode=False, interval=DEFAULT_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL,
+                    retry_seconds=DEFAULT_RETRY_MINUTES * 60):
+    """Watch every cohort (None: the one configured in .env) until SIGINT/SIGTERM"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Not supported on this platform; Ctrl+C still ends the process
+
+    sa = service_account_client()
+    sheets_limiter = sheets_rate_limiter_from_env()
+    watchers = [Watcher(cohort, debug_mode, sa, sheets_limiter, interval, max_interval, retry_seconds)
+                for cohort in cohorts]
+    await asyncio.gather(*(watcher.watch(stop) for watcher in watchers))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send reminders shortly after each class is recorded")
+    parser.add_argument("config", nargs="?", default=None, help="cohorts config file (default: the .env settings)")
+    parser.add_argument("-d", "--debug", action="store_true", help="print emails instead of sending them")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="seconds between polls after a change")
+    parser.add_argument("--max-interval", type=float, default=DEFAULT_MAX_INTERVAL,
+                        help="longest wait in seconds between polls while nothing changes")
+    parser.add_argument("--retry-minutes", type=float, default=DEFAULT_RETRY_MINUTES,
+                        help="minutes before a class whose reminders didn't all go out is retried")
+    args = parser.parse_args()
+
+    if args.debug:
+        print("🐛 DEBUG MODE ENABLED - No emails will be sent")
+        print("=" * 50)
+
+    cohorts = load_cohorts(args.config) if args.config else [None]
+    asyncio.run(watch_all(cohorts, args.debug, args.interval, args.max_interval, args.retry_minutes * 60))